@@ -0,0 +1,70 @@
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+
+class WebSocketClosed(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"WebSocket closed with code {code}")
+        self.code = code
+
+
+class ASGIWebSocketClient:
+    def __init__(self, app, url: str):
+        self.app = app
+        self.url = urlsplit(url)
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "scheme": "ws",
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 0),
+            "root_path": "",
+            "path": self.url.path,
+            "raw_path": self.url.path.encode(),
+            "query_string": self.url.query.encode(),
+            "headers": [(b"host", b"testserver")],
+            "subprotocols": [],
+        }
+        self.task = asyncio.create_task(
+            self.app(scope, self.incoming.get, self.outgoing.put)
+        )
+        await self.incoming.put({"type": "websocket.connect"})
+        message = await self.receive()
+        if message["type"] != "websocket.accept":
+            raise WebSocketClosed(message.get("code", 1006))
+
+    async def send_json(self, data: dict):
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive(self) -> dict:
+        if self.outgoing.empty() and self.task.done():
+            raise WebSocketClosed(1011) from self.task.exception()
+        # The app may stop without sending anything, so the read also waits
+        # on its task; the getter must not outlive a cancelled read.
+        getter = asyncio.ensure_future(self.outgoing.get())
+        try:
+            await asyncio.wait([getter, self.task], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not getter.done():
+                getter.cancel()
+        if getter.cancelled():
+            raise WebSocketClosed(1011) from self.task.exception()
+        return getter.result()
+
+    async def receive_json(self) -> dict:
+        message = await self.receive()
+        if message["type"] == "websocket.close":
+            raise WebSocketClosed(message.get("code", 1000))
+        return json.loads(message.get("text") or message["bytes"])
+
+    async def close(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        if self.task is not None:
+            await asyncio.gather(self.task, return_exceptions=True)
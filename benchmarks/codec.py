@@ -0,0 +1,121 @@
+import argparse
+import random
+import timeit
+import uuid
+from benchmarks import fakes  # noqa: F401
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
+from constants.codec import CODECS, COMPRESSIONS
+from models.message import Message
+from utils.codec import ContextCodec, codecs, compressions
+
+WORDS = (
+    "the model can help you plan a trip compare options write code explain "
+    "errors summarize documents translate text and answer questions about "
+    "your product order account settings billing delivery or weather today"
+).split()
+
+
+def build_sentence(words: int) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def build_conversation(turns: int, reply_words: int):
+    messages = []
+    for _ in range(turns):
+        messages.append(
+            Message(
+                id=str(uuid.uuid4()),
+                prompt=f"{SYSTEM_ROLES.USER.value}: {build_sentence(12)}",
+                role=MESSAGE_ROLES.USER.value,
+            )
+        )
+        reply = " ".join(build_sentence(15) for _ in range(reply_words // 15))
+        messages.append(
+            Message(
+                id=str(uuid.uuid4()),
+                prompt=f"{SYSTEM_ROLES.AI.value}: {reply}",
+                role=MESSAGE_ROLES.AI.value,
+            )
+        )
+    return messages
+
+
+def redis_memory(redis_url: str, entries: list) -> str:
+    if not redis_url:
+        return "n/a"
+    from redis import Redis
+
+    redis = Redis.from_url(redis_url)
+    key = f"benchmark:codec:{uuid.uuid4().hex}"
+    try:
+        redis.rpush(key, *entries)
+        return f"{redis.memory_usage(key, samples=0) / 1024:.1f}KiB"
+    finally:
+        redis.delete(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Encode/decode time and stored size of one conversation."
+    )
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--reply-words", type=int, default=120)
+    parser.add_argument("--threshold", type=int, default=512)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--redis-url", default="", help="Measure MEMORY USAGE too.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    messages = build_conversation(args.turns, args.reply_words)
+    print(f"conversation: {args.turns} turns, {len(messages)} messages")
+    print(f"{'format':<18}{'encode':>10}{'decode':>10}{'stored':>12}{'redis':>12}")
+
+    entries = [message.json() for message in messages]
+    encode = timeit.timeit(
+        lambda: [message.json() for message in messages], number=args.number
+    )
+    decode = timeit.timeit(
+        lambda: [Message.parse_raw(entry) for entry in entries], number=args.number
+    )
+    print(
+        f"{'pydantic json':<18}"
+        f"{encode / args.number * 1e3:>8.2f}ms{decode / args.number * 1e3:>8.2f}ms"
+        f"{sum(len(entry.encode()) for entry in entries) / 1024:>9.1f}KiB"
+        f"{redis_memory(args.redis_url, entries):>12}"
+    )
+
+    for codec in CODECS:
+        for compression in COMPRESSIONS:
+            name = f"{codec.value}+{compression.value}"
+            if codec.value not in codecs or compression.value not in compressions:
+                print(f"{name:<18}{'not installed':>22}")
+                continue
+            contextCodec = ContextCodec(
+                codec=codec.value,
+                compression=compression.value,
+                threshold=args.threshold,
+            )
+            data = [message.dict() for message in messages]
+            entries = [contextCodec.encode(item) for item in data]
+            encode = timeit.timeit(
+                lambda: [contextCodec.encode(item) for item in data],
+                number=args.number,
+            )
+            decode = timeit.timeit(
+                lambda: [
+                    Message.parse_obj(contextCodec.decode(entry)) for entry in entries
+                ],
+                number=args.number,
+            )
+            print(
+                f"{name:<18}"
+                f"{encode / args.number * 1e3:>8.2f}ms"
+                f"{decode / args.number * 1e3:>8.2f}ms"
+                f"{sum(len(entry) for entry in entries) / 1024:>9.1f}KiB"
+                f"{redis_memory(args.redis_url, entries):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import timeit
+import uuid
+from benchmarks import fakes  # noqa: F401
+from constants.ai import (
+    AI_MODELS,
+    GEMINI_CONTEXT_MESSAGE_KEYS,
+    GEMINI_ROLES,
+    GPT_CONTEXT_MESSAGE_KEYS,
+    GPT_ROLES,
+)
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
+from models.message import Message
+from services.context import decode_message, encode_message
+from services.messages import serialize_message
+
+
+def build_history(size: int):
+    messages = []
+    for index in range(size):
+        if index % 2 == 0:
+            prompt = f"{SYSTEM_ROLES.USER.value}: question {index} about the product"
+            role = MESSAGE_ROLES.USER.value
+        else:
+            prompt = f"{SYSTEM_ROLES.AI.value}: answer {index} with a few sentences."
+            role = MESSAGE_ROLES.AI.value
+        messages.append(Message(id=str(uuid.uuid4()), prompt=prompt, role=role))
+    return [encode_message(message) for message in messages]
+
+
+def legacy_context_messages(model: str, raw_messages: list):
+    context_messages = []
+    for msg in [Message.parse_raw(raw) for raw in raw_messages]:
+        if msg.prompt.startswith(f"{SYSTEM_ROLES.USER.value}:"):
+            content = msg.prompt.replace(f"{SYSTEM_ROLES.USER.value}:", "")
+            gpt_role, gemini_role = GPT_ROLES.USER.value, GEMINI_ROLES.USER.value
+        elif msg.prompt.startswith(f"{SYSTEM_ROLES.AI.value}:"):
+            content = msg.prompt.replace(f"{SYSTEM_ROLES.AI.value}:", "")
+            gpt_role, gemini_role = GPT_ROLES.ASSISTANT.value, GEMINI_ROLES.MODEL.value
+        else:
+            continue
+        if model == AI_MODELS.CHATGPT.value:
+            context_messages.append(
+                {
+                    f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": gpt_role,
+                    f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": content,
+                }
+            )
+        else:
+            context_messages.append(
+                {
+                    f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": gemini_role,
+                    f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [content],
+                }
+            )
+    return context_messages
+
+
+def structured_context_messages(model: str, raw_messages: list):
+    # Entries are decoded the way load_context reads them from Redis.
+    context_messages = []
+    for raw in raw_messages:
+        payload = serialize_message(model=model, message=decode_message(raw))
+        if payload is not None:
+            context_messages.append(payload)
+    return context_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Provider payload construction over a long stored history."
+    )
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument(
+        "--model",
+        default=AI_MODELS.CHATGPT.value,
+        choices=[model.value for model in AI_MODELS],
+    )
+    args = parser.parse_args()
+
+    history = build_history(args.messages)
+    # Each turn sees the same history plus one new message.
+    turns = [history + build_history(1) for _ in range(args.number)]
+    structured_context_messages(args.model, history)
+
+    legacy = timeit.timeit(
+        lambda: legacy_context_messages(args.model, turns.pop()), number=args.number
+    )
+    turns = [history + build_history(1) for _ in range(args.number)]
+    structured = timeit.timeit(
+        lambda: structured_context_messages(args.model, turns.pop()),
+        number=args.number,
+    )
+    print(f"history:     {args.messages} messages")
+    print(f"legacy:      {legacy / args.number * 1e3:.3f}ms/turn")
+    print(f"structured:  {structured / args.number * 1e3:.3f}ms/turn")
+    print(f"speedup:     {legacy / structured:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+BENCHMARK_SETTINGS = {
+    "OPENAI_API_KEY": "benchmark",
+    "GEMINI_API_KEY": "benchmark",
+    "OPENAI_MODEL": "benchmark-openai",
+    "GEMINI_MODEL": "benchmark-gemini",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "REDIS_USER": "default",
+    "REDIS_PASS": "benchmark",
+    "ALLOWED_HOST_1": "http://localhost",
+    "ALLOWED_HOST_2": "http://localhost",
+    "ALLOWED_HOST_3": "http://localhost",
+    "ALLOWED_HOST_4": "http://localhost",
+    "PORT": "8000",
+    "RATE_LIMIT_COUNT": "1000000",
+}
+
+for key, value in BENCHMARK_SETTINGS.items():
+    os.environ.setdefault(key, value)
+
+FAKE_REPLY = "This is a fake provider reply."
+
+
+def build_reply(tokens: int = 0) -> str:
+    if not tokens:
+        return FAKE_REPLY
+    return " ".join(f"token{index}" for index in range(tokens))
+
+
+async def provider_delay(delay: float, blocking: bool):
+    if blocking:
+        time.sleep(delay)
+    else:
+        await asyncio.sleep(delay)
+
+
+async def stream_tokens(reply: str, token_delay: float, build_chunk):
+    for index, token in enumerate(reply.split(" ")):
+        if token_delay:
+            await asyncio.sleep(token_delay)
+        yield build_chunk(token if index == 0 else f" {token}")
+
+
+class FakeStream:
+    # Mirrors the SDK stream objects, which are closed with "async with".
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self.chunks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.chunks.aclose()
+
+
+async def generation_delay(reply: str, token_delay: float):
+    if token_delay:
+        await asyncio.sleep(token_delay * len(reply.split(" ")))
+
+
+class FakeOpenAICompletions:
+    def __init__(
+        self,
+        delay: float,
+        blocking: bool = False,
+        token_delay: float = 0,
+        reply: str = FAKE_REPLY,
+    ):
+        self.delay = delay
+        self.blocking = blocking
+        self.token_delay = token_delay
+        self.reply = reply
+        self.calls = 0
+
+    async def create(self, model: str, messages: list, stream: bool = False, **kwargs):
+        self.calls += 1
+        await provider_delay(self.delay, self.blocking)
+        if stream:
+            return FakeStream(
+                stream_tokens(
+                    self.reply,
+                    self.token_delay,
+                    lambda token: SimpleNamespace(
+                        choices=[SimpleNamespace(delta=SimpleNamespace(content=token))]
+                    ),
+                )
+            )
+        await generation_delay(self.reply, self.token_delay)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))]
+        )
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        delay: float,
+        blocking: bool = False,
+        token_delay: float = 0,
+        reply: str = FAKE_REPLY,
+    ):
+        self.chat = SimpleNamespace(
+            completions=FakeOpenAICompletions(
+                delay=delay, blocking=blocking, token_delay=token_delay, reply=reply
+            )
+        )
+
+    async def close(self):
+        pass
+
+
+class FakeGemini:
+    def __init__(
+        self,
+        delay: float,
+        blocking: bool = False,
+        token_delay: float = 0,
+        reply: str = FAKE_REPLY,
+    ):
+        self.delay = delay
+        self.blocking = blocking
+        self.token_delay = token_delay
+        self.reply = reply
+        self.calls = 0
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        self.calls += 1
+        await provider_delay(self.delay, self.blocking)
+        if stream:
+            return stream_tokens(
+                self.reply, self.token_delay, lambda token: SimpleNamespace(text=token)
+            )
+        await generation_delay(self.reply, self.token_delay)
+        return SimpleNamespace(text=self.reply)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message: dict):
+        self.sent.append(message)
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def create_fake_redis():
+    from fakeredis import FakeAsyncRedis
+
+    return FakeAsyncRedis(decode_responses=True, max_connections=2**16)
+
+
+def install_fake_providers(
+    delay: float, token_delay: float = 0, reply: str = FAKE_REPLY
+):
+    from constants.ai import AI_MODELS
+    from utils.ai import aiClientManager
+
+    openai_client = FakeOpenAI(delay=delay, token_delay=token_delay, reply=reply)
+    gemini_model = FakeGemini(delay=delay, token_delay=token_delay, reply=reply)
+    aiClientManager.clients[AI_MODELS.CHATGPT.value] = openai_client
+    aiClientManager.clients[AI_MODELS.GEMINI.value] = gemini_model
+    return openai_client, gemini_model
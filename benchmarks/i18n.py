@@ -0,0 +1,38 @@
+import argparse
+import gettext
+import timeit
+from benchmarks import fakes  # noqa: F401
+from constants.i18n import DOMAIN, LOCALEDIR, TRANSLATION_KEYS
+from utils.i18n import t
+
+
+def legacy_t(locale: str, key: str) -> str:
+    i18n = gettext.translation(
+        domain=DOMAIN, localedir=LOCALEDIR, fallback=True, languages=[locale]
+    )
+    i18n.install()
+    _ = i18n.gettext
+    return _(key)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare per-call gettext loading with the translation registry."
+    )
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--locale", default="vi")
+    args = parser.parse_args()
+
+    key = TRANSLATION_KEYS.RATE_LIMIT.value
+    assert legacy_t(args.locale, key) == t(args.locale, key)
+
+    legacy = timeit.timeit(lambda: legacy_t(args.locale, key), number=args.number)
+    registry = timeit.timeit(lambda: t(args.locale, key), number=args.number)
+    print(f"calls:     {args.number}")
+    print(f"legacy t:  {legacy / args.number * 1e6:.2f}us/call")
+    print(f"registry:  {registry / args.number * 1e6:.2f}us/call")
+    print(f"speedup:   {legacy / registry:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
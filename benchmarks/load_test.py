@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List
+from benchmarks.client import ASGIWebSocketClient, WebSocketClosed
+from benchmarks.fakes import build_reply, create_fake_redis, install_fake_providers
+from constants.ai import AI_MODELS
+from constants.base import PREFIX
+from constants.redis import AI_REDIS_DATA_KEYS
+from constants.websocket import AI_WS_ACTION_TYPE, AI_WS_MESSAGE_TYPE, WS_KEYS
+from main import app
+from utils.i18n import translationRegistry
+from utils.redis import redisManager
+
+# Frame type that completes each action.
+action_replies = {
+    AI_WS_ACTION_TYPE.SEND_MESSAGE.value: AI_WS_MESSAGE_TYPE.AI_MESSAGE.value,
+    AI_WS_ACTION_TYPE.SWITCH_MODEL.value: AI_WS_MESSAGE_TYPE.SWITCH_MODEL.value,
+    AI_WS_ACTION_TYPE.NEW_CONTEXT.value: AI_WS_MESSAGE_TYPE.CONTEXT.value,
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def choose_action(args) -> dict:
+    roll = random.random()
+    model = random.choice([model.value for model in AI_MODELS])
+    if roll < args.switch_ratio:
+        return {
+            f"{WS_KEYS.ACTION.value}": AI_WS_ACTION_TYPE.SWITCH_MODEL.value,
+            f"{AI_REDIS_DATA_KEYS.MODEL.value}": model,
+        }
+    if roll < args.switch_ratio + args.new_context_ratio:
+        return {f"{WS_KEYS.ACTION.value}": AI_WS_ACTION_TYPE.NEW_CONTEXT.value}
+    return {
+        f"{WS_KEYS.ACTION.value}": AI_WS_ACTION_TYPE.SEND_MESSAGE.value,
+        f"{AI_REDIS_DATA_KEYS.MODEL.value}": model,
+        f"{AI_REDIS_DATA_KEYS.PROMT.value}": random.choice(args.prompts),
+        f"{AI_REDIS_DATA_KEYS.STREAM.value}": random.random() < args.stream_ratio,
+    }
+
+
+async def wait_for(client: ASGIWebSocketClient, message_type: str):
+    while True:
+        message = await client.receive_json()
+        if message["type"] == message_type:
+            return message
+
+
+async def connect_device(index: int) -> ASGIWebSocketClient:
+    client = ASGIWebSocketClient(app, f"{PREFIX}/ws/en/load-device-{index}")
+    await client.connect()
+    await wait_for(client, AI_WS_MESSAGE_TYPE.CONTEXT.value)
+    return client
+
+
+async def run_device(
+    client: ASGIWebSocketClient,
+    args,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+):
+    for _ in range(args.actions):
+        data = choose_action(args)
+        action = data[f"{WS_KEYS.ACTION.value}"]
+        started = time.perf_counter()
+        try:
+            await client.send_json(data)
+            await asyncio.wait_for(
+                wait_for(client, action_replies[action]), timeout=args.timeout
+            )
+        except (asyncio.TimeoutError, WebSocketClosed) as e:
+            errors[type(e).__name__] += 1
+            return
+        latencies[action].append(time.perf_counter() - started)
+        if args.think:
+            await asyncio.sleep(random.uniform(0, args.think))
+
+
+async def run(args):
+    redis = create_fake_redis()
+    app.dependency_overrides[redisManager.get_redis] = lambda: redis
+    translationRegistry.load()
+    install_fake_providers(
+        delay=args.provider_delay,
+        token_delay=1 / args.token_rate if args.token_rate else 0,
+        reply=build_reply(args.reply_tokens),
+    )
+
+    # Warm up imports, caches and lazy clients outside the measured window.
+    await (await connect_device(-1)).close()
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(index: int):
+        async with semaphore:
+            return await connect_device(index)
+
+    connect_started = time.perf_counter()
+    clients = await asyncio.gather(*[connect(index) for index in range(args.devices)])
+    connect_elapsed = time.perf_counter() - connect_started
+    connected, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[run_device(client, args, latencies, errors) for client in clients]
+    )
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*[client.close() for client in clients])
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"devices:                 {args.devices}")
+    print(f"connect time:            {connect_elapsed:.2f}s")
+    print(
+        f"memory per connection:   {(connected - baseline) / args.devices / 1024:.1f}KiB"
+    )
+    print(f"actions completed:       {total}")
+    print(f"elapsed:                 {elapsed:.2f}s")
+    print(f"throughput:              {total / elapsed:.1f} actions/s")
+    for action, values in sorted(latencies.items()):
+        print(
+            f"{action:<24} n={len(values):<7}"
+            f" p50={percentile(values, 0.50) * 1000:.1f}ms"
+            f" p90={percentile(values, 0.90) * 1000:.1f}ms"
+            f" p99={percentile(values, 0.99) * 1000:.1f}ms"
+            f" max={max(values) * 1000:.1f}ms"
+        )
+    for error, count in sorted(errors.items()):
+        print(f"errors ({error}):        {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Drive simulated devices through the WebSocket endpoint in-process, "
+            "with fake providers and an in-memory Redis."
+        )
+    )
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--actions", type=int, default=10, help="Actions per device.")
+    parser.add_argument("--provider-delay", type=float, default=0.2)
+    parser.add_argument(
+        "--token-rate", type=float, default=0, help="Tokens per second, 0 = instant."
+    )
+    parser.add_argument("--reply-tokens", type=int, default=0)
+    parser.add_argument("--stream-ratio", type=float, default=0.5)
+    parser.add_argument("--switch-ratio", type=float, default=0.1)
+    parser.add_argument("--new-context-ratio", type=float, default=0.05)
+    parser.add_argument("--think", type=float, default=0, help="Max think time (s).")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--prompts",
+        nargs="+",
+        default=["hi", "what can you do?", "tell me a joke", "how is the weather?"],
+    )
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import time
+from benchmarks.fakes import (
+    FakeGemini,
+    FakeOpenAI,
+    FakeWebSocket,
+    create_fake_redis,
+)
+from constants.ai import AI_MODELS
+from constants.redis import AI_REDIS_DATA_KEYS
+from constants.websocket import WS_KEYS
+from services.ai import generate_initial_conversation, handle_send_message
+from services.session import ContextSession
+from utils.ai import aiClientManager
+from utils.websocket import Connection
+
+
+async def run(
+    devices: int, delay: float, model: str, blocking: bool, same_prompt: bool
+) -> tuple:
+    openai_client = FakeOpenAI(delay=delay, blocking=blocking)
+    gemini_model = FakeGemini(delay=delay, blocking=blocking)
+    aiClientManager.clients[AI_MODELS.CHATGPT.value] = openai_client
+    aiClientManager.clients[AI_MODELS.GEMINI.value] = gemini_model
+    redis = create_fake_redis()
+    connections = []
+
+    for index in range(devices):
+        device_id = f"device-{index}"
+        connection = Connection(FakeWebSocket(), device_id, device_id)
+        session = ContextSession(
+            context_key=f"{WS_KEYS.CONTEXT.value}:{device_id}", redis=redis
+        )
+        await generate_initial_conversation(
+            connection=connection, locale="en", session=session
+        )
+        connections.append((connection, session))
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[
+            handle_send_message(
+                connection=connection,
+                locale="en",
+                session=session,
+                data={
+                    f"{AI_REDIS_DATA_KEYS.MODEL.value}": model,
+                    f"{AI_REDIS_DATA_KEYS.PROMT.value}": (
+                        "hi" if same_prompt else f"hi {index}"
+                    ),
+                },
+                redis=redis,
+            )
+            for index, (connection, session) in enumerate(connections)
+        ]
+    )
+    elapsed = time.perf_counter() - started
+    for connection, session in connections:
+        await session.close()
+        connection.stop()
+    calls = openai_client.chat.completions.calls + gemini_model.calls
+    return elapsed, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concurrent provider calls against a fixed-delay fake provider."
+    )
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument(
+        "--model",
+        default=AI_MODELS.CHATGPT.value,
+        choices=[model.value for model in AI_MODELS],
+    )
+    parser.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Simulate the old synchronous SDK call for comparison.",
+    )
+    parser.add_argument(
+        "--same-prompt",
+        action="store_true",
+        help="Send one prompt from every device to exercise single-flight.",
+    )
+    args = parser.parse_args()
+
+    elapsed, calls = asyncio.run(
+        run(args.devices, args.delay, args.model, args.blocking, args.same_prompt)
+    )
+    print(f"devices:          {args.devices}")
+    print(f"provider delay:   {args.delay:.3f}s")
+    print(f"wall time:        {elapsed:.3f}s")
+    print(f"round trips:      {elapsed / args.delay:.2f}")
+    print(f"provider calls:   {calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, NamedTuple
+from benchmarks import fakes  # noqa: F401
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Provider SDKs must only load on first use or at warmup, never on import.
+LAZY_MODULES = ("openai", "google.generativeai", "httpx")
+
+
+class ImportTime(NamedTuple):
+    name: str
+    self_us: int
+    cumulative_us: int
+
+
+def measure(module: str) -> List[ImportTime]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=os.environ,
+    )
+    if result.returncode:
+        sys.exit(result.stderr)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append(ImportTime(name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import time of the app, from python -X importtime."
+    )
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--max-ms", type=float, default=0, help="Fail above this import time."
+    )
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.repeat)]
+    totals = [
+        next(item.cumulative_us for item in run if item.name == args.module)
+        for run in runs
+    ]
+    best = runs[totals.index(min(totals))]
+    packages = {}
+    for item in best:
+        package = item.name.split(".")[0]
+        packages[package] = packages.get(package, 0) + item.self_us
+
+    print(f"import {args.module}: {min(totals) / 1000:.1f}ms best of {args.repeat}")
+    print(f"{'package':<28}{'self total':>12}")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[
+        : args.top
+    ]:
+        print(f"{package:<28}{self_us / 1000:>10.1f}ms")
+
+    failures = []
+    loaded = {item.name for item in best}
+    eager = [module for module in LAZY_MODULES if module in loaded]
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if args.max_ms and min(totals) / 1000 > args.max_ms:
+        failures.append(f"import time above {args.max_ms:.0f}ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+from benchmarks.fakes import build_reply, create_fake_redis, install_fake_providers
+from main import app  # noqa: F401
+from utils.redis import redisManager
+
+# Imported by every server worker of benchmarks.workers: each worker process
+# gets its own in-memory Redis and fake providers, configured through the
+# environment since workers are spawned, not forked.
+redisManager.redis = create_fake_redis()
+install_fake_providers(
+    delay=float(os.environ.get("BENCHMARK_PROVIDER_DELAY", "0")),
+    reply=build_reply(int(os.environ.get("BENCHMARK_REPLY_TOKENS", "0"))),
+)
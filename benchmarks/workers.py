@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, NamedTuple
+from benchmarks import fakes  # noqa: F401
+import websockets
+from constants.ai import AI_MODELS
+from constants.base import PREFIX
+from constants.redis import AI_REDIS_DATA_KEYS
+from constants.websocket import AI_WS_ACTION_TYPE, AI_WS_MESSAGE_TYPE, WS_KEYS
+from utils.server import select_http, select_loop
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_APP = "benchmarks.worker_app:app"
+SERVER_HOST = "127.0.0.1"
+
+
+class ClientResult(NamedTuple):
+    completed: int
+    errors: int
+    started: float
+    finished: float
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((SERVER_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, args, log) -> subprocess.Popen:
+    # The launcher is the one main.py uses, so the workers get the same loop,
+    # HTTP and WebSocket settings as production.
+    code = (
+        "from benchmarks import fakes; from utils.server import run_server; "
+        f"run_server(app={SERVER_APP!r}, host={SERVER_HOST!r}, port={port},"
+        f" workers={workers})"
+    )
+    env = dict(
+        os.environ,
+        BENCHMARK_PROVIDER_DELAY=str(args.provider_delay),
+        BENCHMARK_REPLY_TOKENS=str(args.reply_tokens),
+    )
+    return subprocess.Popen(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, stdout=log, stderr=log
+    )
+
+
+def wait_for_port(port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((SERVER_HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server did not listen on port {port}")
+
+
+async def wait_for(ws, message_type: str):
+    while True:
+        message = json.loads(await ws.recv())
+        if message["type"] == message_type:
+            return message
+
+
+async def connect_device(port: int, name: str, timeout: float):
+    # Workers may still be starting; connections wait in the backlog.
+    ws = await websockets.connect(
+        f"ws://{SERVER_HOST}:{port}{PREFIX}/ws/en/{name}",
+        max_size=None,
+        open_timeout=timeout,
+    )
+    await asyncio.wait_for(
+        wait_for(ws, AI_WS_MESSAGE_TYPE.CONTEXT.value), timeout=timeout
+    )
+    return ws
+
+
+async def run_device(ws, name: str, args) -> int:
+    completed = 0
+    for action in range(args.actions):
+        await ws.send(
+            json.dumps(
+                {
+                    f"{WS_KEYS.ACTION.value}": AI_WS_ACTION_TYPE.SEND_MESSAGE.value,
+                    f"{AI_REDIS_DATA_KEYS.MODEL.value}": AI_MODELS.CHATGPT.value,
+                    # Distinct prompts, so single-flight cannot merge calls.
+                    f"{AI_REDIS_DATA_KEYS.PROMT.value}": f"{name} prompt {action}",
+                    f"{AI_REDIS_DATA_KEYS.STREAM.value}": False,
+                }
+            )
+        )
+        await asyncio.wait_for(
+            wait_for(ws, AI_WS_MESSAGE_TYPE.AI_MESSAGE.value), timeout=args.timeout
+        )
+        completed += 1
+    return completed
+
+
+async def run_client(index: int, port: int, args, barrier) -> ClientResult:
+    names = [
+        f"workers-{port}-{index}-{device}" for device in range(args.devices_per_client)
+    ]
+    sockets = await asyncio.gather(
+        *[connect_device(port, name, args.timeout) for name in names]
+    )
+    # Every client starts sending at once, after all devices are connected.
+    await asyncio.to_thread(barrier.wait)
+    started = time.time()
+    results = await asyncio.gather(
+        *[run_device(ws, name, args) for ws, name in zip(sockets, names)],
+        return_exceptions=True,
+    )
+    finished = time.time()
+    await asyncio.gather(*[ws.close() for ws in sockets], return_exceptions=True)
+    completed = sum(result for result in results if isinstance(result, int))
+    errors = sum(1 for result in results if isinstance(result, BaseException))
+    return ClientResult(completed, errors, started, finished)
+
+
+def client_process(index: int, port: int, args, barrier, results):
+    try:
+        results.put(asyncio.run(run_client(index, port, args, barrier)))
+    except Exception as e:
+        barrier.abort()
+        results.put(e)
+
+
+def measure(workers: int, args) -> List[ClientResult]:
+    port = get_free_port()
+    with tempfile.TemporaryFile() as log:
+        server = start_server(workers, port, args, log)
+        try:
+            wait_for_port(port, args.timeout)
+            barrier = multiprocessing.Barrier(args.clients)
+            results = multiprocessing.Queue()
+            clients = [
+                multiprocessing.Process(
+                    target=client_process, args=(index, port, args, barrier, results)
+                )
+                for index in range(args.clients)
+            ]
+            for client in clients:
+                client.start()
+            outcomes = [results.get() for _ in clients]
+            for client in clients:
+                client.join()
+        finally:
+            server.terminate()
+            server.wait()
+        failures = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if failures:
+            log.seek(0)
+            sys.stderr.write(log.read().decode(errors="replace"))
+            raise RuntimeError(f"{len(failures)} client(s) failed: {failures[0]!r}")
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare send_message throughput over TCP with 1 and N workers."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, max(os.cpu_count() or 1, 2)],
+        help="Worker counts to measure.",
+    )
+    parser.add_argument("--clients", type=int, default=2, help="Client processes.")
+    parser.add_argument("--devices-per-client", type=int, default=100)
+    parser.add_argument("--actions", type=int, default=20, help="Actions per device.")
+    parser.add_argument("--provider-delay", type=float, default=0)
+    parser.add_argument("--reply-tokens", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}, loop: {select_loop()}, http: {select_http()}")
+    baseline = None
+    for workers in args.workers:
+        outcomes = measure(workers, args)
+        completed = sum(outcome.completed for outcome in outcomes)
+        errors = sum(outcome.errors for outcome in outcomes)
+        elapsed = max(outcome.finished for outcome in outcomes) - min(
+            outcome.started for outcome in outcomes
+        )
+        throughput = completed / elapsed
+        baseline = baseline or throughput
+        print(
+            f"workers={workers:<3} messages={completed:<7} errors={errors:<4}"
+            f" elapsed={elapsed:.2f}s throughput={throughput:.1f} msg/s"
+            f" speedup={throughput / baseline:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,28 @@ from enum import Enum
 from core.setting import settings
 
 GPT_DEFAULT_CONTENT = "You are a helpful assistant."
+OPENAI_MAX_CONNECTIONS = settings.OPENAI_MAX_CONNECTIONS
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+CONTEXT_SUMMARY_CONTENT = "Summary of the earlier conversation:"
+CONTEXT_TOKEN_BUDGET = settings.CONTEXT_TOKEN_BUDGET
+CONTEXT_TOKEN_BUDGET_MODELS = settings.CONTEXT_TOKEN_BUDGET_MODELS  # model: tokens
+CONTEXT_SUMMARY_TOKEN_BUDGET = settings.CONTEXT_SUMMARY_TOKEN_BUDGET
+CONTEXT_SUMMARY_LINE_LENGTH = 200  # characters
+MESSAGE_TOKEN_OVERHEAD = 4
+MESSAGE_CACHE_SIZE = 50000
+PROVIDER_STATE_PATH = "/providers"
+PROVIDER_MAX_CONCURRENCY = settings.PROVIDER_MAX_CONCURRENCY  # per model
+PROVIDER_MAX_QUEUE = settings.PROVIDER_MAX_QUEUE  # waiting calls per model
+PROVIDER_TIMEOUT = settings.PROVIDER_TIMEOUT  # seconds per attempt or stream chunk
+PROVIDER_DEADLINE = settings.PROVIDER_DEADLINE  # seconds across retries and fallback
+PROVIDER_MAX_RETRIES = settings.PROVIDER_MAX_RETRIES
+PROVIDER_RETRY_BASE_DELAY = settings.PROVIDER_RETRY_BASE_DELAY  # seconds
+PROVIDER_RETRY_MAX_DELAY = settings.PROVIDER_RETRY_MAX_DELAY  # seconds
+PROVIDER_BREAKER_THRESHOLD = settings.PROVIDER_BREAKER_THRESHOLD  # failures in a row
+PROVIDER_BREAKER_RESET = settings.PROVIDER_BREAKER_RESET  # seconds open
+PROVIDER_FALLBACK = settings.PROVIDER_FALLBACK
+PROVIDER_WARMUP = settings.PROVIDER_WARMUP  # load provider SDKs at startup
+PROVIDER_RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
 
 
 class AI_MODELS(str, Enum):
@@ -43,3 +65,14 @@ class GEMINI_ROLES(str, Enum):
 class GEMINI_CONTEXT_MESSAGE_KEYS(str, Enum):
     ROLE = "role"
     PARTS = "parts"
+
+
+class PROVIDER_POOLS(str, Enum):
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+
+class CIRCUIT_STATES(str, Enum):
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
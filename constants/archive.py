@@ -0,0 +1,10 @@
+from core.setting import settings
+
+CONTEXT_ARCHIVE_ENABLED = settings.CONTEXT_ARCHIVE_ENABLED
+CONTEXT_ARCHIVE_PATH = settings.CONTEXT_ARCHIVE_PATH
+# A turn is a user message and its reply.
+CONTEXT_HOT_MESSAGES = settings.CONTEXT_HOT_TURNS * 2
+CONTEXT_ARCHIVE_BATCH = 10  # messages moved out of Redis at a time
+CONTEXT_ARCHIVE_RETENTION = settings.CONTEXT_ARCHIVE_RETENTION  # 30 days by seconds
+CONTEXT_ARCHIVE_PRUNE_INTERVAL = 3600  # seconds
+CONTEXT_ARCHIVE_BUSY_TIMEOUT = 5  # seconds
@@ -5,6 +5,8 @@ HOST = "0.0.0.0"
 PORT = settings.PORT
 MODULE = "__main__"
 PREFIX = "/api"
+AUTH_SCHEME = "Bearer"
+ADMIN_TOKEN = settings.ADMIN_TOKEN  # bearer token for the admin endpoints, empty = off
 ORIGINS = [
     settings.ALLOWED_HOST_1,
     settings.ALLOWED_HOST_2,
@@ -13,10 +15,21 @@ ORIGINS = [
 ]
 ALLOWED_METHODS = []
 ALLOWED_HEADERS = ["*"]
-RATE_LIMIT_COUNT = 5
-RATE_LIMIT_PERIOD = 10  # seconds
+RATE_LIMIT_COUNT = settings.RATE_LIMIT_COUNT
+RATE_LIMIT_PERIOD = settings.RATE_LIMIT_PERIOD  # seconds
+RATE_LIMIT_MODELS = settings.RATE_LIMIT_MODELS  # model: [count, period]
+RATE_LIMIT_LOCAL_MAX_KEYS = settings.RATE_LIMIT_LOCAL_MAX_KEYS
+RATE_LIMIT_MAX_PERIOD = max(
+    [RATE_LIMIT_PERIOD] + [period for _, period in RATE_LIMIT_MODELS.values()]
+)  # seconds
 
 
 class SYSTEM_ROLES(str, Enum):
     USER = "You"
     AI = "AI"
+
+
+class MESSAGE_ROLES(str, Enum):
+    USER = "user"
+    AI = "ai"
+    SYSTEM = "system"
@@ -0,0 +1,43 @@
+from enum import Enum
+from core.setting import settings
+
+BATCH_PATH = "/batch"
+BATCH_MEDIA_TYPE = "application/x-ndjson"
+BATCH_CONCURRENCY = settings.BATCH_CONCURRENCY  # requests in flight per provider
+BATCH_RATE = settings.BATCH_RATE  # requests per second per provider, 0 for no limit
+BATCH_WINDOW = settings.BATCH_WINDOW  # records held while waiting to be written
+BATCH_CHECKPOINT_EVERY = settings.BATCH_CHECKPOINT_EVERY  # records
+BATCH_TOKEN = settings.BATCH_TOKEN  # bearer token for POST /batch, empty = off
+BATCH_SPOOL_SIZE = 1024 * 1024  # bytes of request body kept in memory
+BATCH_DEFAULT_LOCALE = "en"
+BATCH_CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+class BATCH_RECORD_KEYS(str, Enum):
+    ID = "id"
+    PROMPT = "prompt"
+    MODEL = "model"
+    LOCALE = "locale"
+    HISTORY = "history"
+    ROLE = "role"
+
+
+class BATCH_RESULT_KEYS(str, Enum):
+    LINE = "line"
+    ID = "id"
+    MODEL = "model"
+    ANSWERED_MODEL = "answered_model"
+    RESPONSE = "response"
+    ERROR = "error"
+
+
+class BATCH_CHECKPOINT_KEYS(str, Enum):
+    LINE = "line"
+    OFFSET = "offset"
+
+
+class BATCH_ERRORS(str, Enum):
+    INVALID_JSON = "invalid_json"
+    MISSING_PROMPT = "missing_prompt"
+    UNKNOWN_MODEL = "unknown_model"
+    UNAVAILABLE = "unavailable"
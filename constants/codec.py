@@ -0,0 +1,33 @@
+from enum import Enum
+from core.setting import settings
+
+CONTEXT_CODEC = settings.CONTEXT_CODEC
+CONTEXT_COMPRESSION = settings.CONTEXT_COMPRESSION
+CONTEXT_COMPRESSION_THRESHOLD = settings.CONTEXT_COMPRESSION_THRESHOLD  # bytes
+# Entries written before the codec layer are bare JSON objects.
+LEGACY_JSON_PREFIX = b"{"
+
+
+class CODECS(str, Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+class COMPRESSIONS(str, Enum):
+    NONE = "none"
+    ZLIB = "zlib"
+    ZSTD = "zstd"
+    LZ4 = "lz4"
+
+
+# The format byte of an encoded entry is codec id * 16 + compression id.
+CODEC_IDS = {
+    CODECS.JSON.value: 1,
+    CODECS.MSGPACK.value: 2,
+}
+COMPRESSION_IDS = {
+    COMPRESSIONS.NONE.value: 0,
+    COMPRESSIONS.ZLIB.value: 1,
+    COMPRESSIONS.ZSTD.value: 2,
+    COMPRESSIONS.LZ4.value: 3,
+}
@@ -0,0 +1,31 @@
+from enum import Enum
+from core.setting import settings
+
+METRICS_ENABLED = settings.METRICS_ENABLED
+METRICS_PATH = "/metrics"
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+
+class MESSAGE_STAGES(str, Enum):
+    BUILD_CONTEXT = "build_context"
+    CACHE_LOOKUP = "cache_lookup"
+    PROVIDER = "provider"
+    SAVE_CONTEXT = "save_context"
+    SEND_AI_MESSAGE = "send_ai_message"
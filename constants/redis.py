@@ -2,6 +2,30 @@ from enum import Enum
 from core.setting import settings
 
 CONTEXT_EXPIRE_TIME = 86400  # 24hrs by seconds
+CONTEXT_FLUSH_RETRIES = 3
+CONTEXT_FLUSH_DELAY = settings.CONTEXT_FLUSH_DELAY  # seconds, 0 = write-through
+CONTEXT_MAX_UNFLUSHED_MESSAGES = settings.CONTEXT_MAX_UNFLUSHED_MESSAGES
+CONTEXT_INVALIDATE_CHANNEL = "context_invalidate"
+CONTEXT_INVALIDATE_RETRY_DELAY = 1  # seconds
+RATE_LIMIT_KEY = "rate_limit"
+CLUSTER_PRESENCE_KEY = "cluster:presence"
+CLUSTER_NODES_KEY = "cluster:nodes"
+CLUSTER_NODE_KEY = "cluster:node"
+# The hash tag keeps the index and every entry in one cluster slot, so the
+# store script may evict entries it was not handed as keys.
+RESPONSE_CACHE_KEY = "{response_cache}"
+RESPONSE_CACHE_INDEX_KEY = "{response_cache}:index"
+RESPONSE_CACHE_ENABLED = settings.RESPONSE_CACHE_ENABLED
+RESPONSE_CACHE_TTL = settings.RESPONSE_CACHE_TTL  # seconds
+RESPONSE_CACHE_MAX_ENTRIES = settings.RESPONSE_CACHE_MAX_ENTRIES
+RESPONSE_CACHE_LOCAL_MAX_ENTRIES = settings.RESPONSE_CACHE_LOCAL_MAX_ENTRIES
+RESPONSE_CACHE_WINDOW = settings.RESPONSE_CACHE_WINDOW  # trailing messages
+SINGLE_FLIGHT_KEY = "single_flight"
+SINGLE_FLIGHT_ENABLED = settings.SINGLE_FLIGHT_ENABLED
+SINGLE_FLIGHT_REDIS = settings.SINGLE_FLIGHT_REDIS  # share calls across workers
+SINGLE_FLIGHT_LOCK_TTL = settings.SINGLE_FLIGHT_LOCK_TTL  # seconds
+SINGLE_FLIGHT_RESULT_TTL = settings.SINGLE_FLIGHT_RESULT_TTL  # seconds
+SINGLE_FLIGHT_POLL_INTERVAL = settings.SINGLE_FLIGHT_POLL_INTERVAL  # seconds
 
 
 class REDIS_CONNECTION_PARAMETERS(str, Enum):
@@ -15,3 +39,21 @@ class REDIS_CONNECTION_PARAMETERS(str, Enum):
 class AI_REDIS_DATA_KEYS(str, Enum):
     MODEL = "model"
     PROMT = "prompt"
+    STREAM = "stream"
+    NO_CACHE = "no_cache"
+    BEFORE = "before"
+    LIMIT = "limit"
+
+
+class CONTEXT_REDIS_KEYS(str, Enum):
+    MESSAGES = "messages"
+    META = "meta"
+
+
+class CONTEXT_META_FIELDS(str, Enum):
+    ID = "id"
+    CURRENT_MODEL = "current_model"
+    SUMMARY = "summary"
+    SUMMARY_COUNT = "summary_count"
+    ARCHIVED_COUNT = "archived_count"
+    VERSION = "version"
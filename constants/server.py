@@ -0,0 +1,25 @@
+from enum import Enum
+from core.setting import settings
+
+SERVER_APP = "main:app"
+SERVER_WORKERS = settings.SERVER_WORKERS
+SERVER_LOOP = settings.SERVER_LOOP
+SERVER_HTTP = settings.SERVER_HTTP
+SERVER_BACKLOG = settings.SERVER_BACKLOG  # pending connections per socket
+SERVER_KEEP_ALIVE = settings.SERVER_KEEP_ALIVE  # seconds
+WS_MAX_SIZE = settings.WS_MAX_SIZE  # bytes per incoming message, 1MB
+WS_PROTOCOL_PING_INTERVAL = settings.WS_PROTOCOL_PING_INTERVAL  # seconds, 0 = off
+WS_PROTOCOL_PING_TIMEOUT = settings.WS_PROTOCOL_PING_TIMEOUT  # seconds
+WS_COMPRESSION = settings.WS_COMPRESSION
+
+
+class SERVER_LOOPS(str, Enum):
+    AUTO = "auto"
+    UVLOOP = "uvloop"
+    ASYNCIO = "asyncio"
+
+
+class SERVER_HTTP_PROTOCOLS(str, Enum):
+    AUTO = "auto"
+    HTTPTOOLS = "httptools"
+    H11 = "h11"
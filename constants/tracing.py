@@ -0,0 +1,50 @@
+from enum import Enum
+from core.setting import settings
+
+SERVICE_NAME = "ai-assistant"
+TRACING_ENABLED = settings.TRACING_ENABLED
+TRACE_SLOW_THRESHOLD = settings.TRACE_SLOW_THRESHOLD  # seconds
+TRACE_FILE_PATH = settings.TRACE_FILE_PATH
+TRACE_FILE_MAX_BYTES = settings.TRACE_FILE_MAX_BYTES  # bytes, 10MB
+TRACE_FILE_BACKUPS = settings.TRACE_FILE_BACKUPS  # rotated files kept
+TRACE_MAX_SPANS = 256  # per trace, later spans are counted and dropped
+TRACE_QUEUE_SIZE = 1000  # traces waiting to be written, later ones are dropped
+LOOP_LAG_INTERVAL = settings.LOOP_LAG_INTERVAL  # seconds, 0 = off
+LOOP_BLOCK_THRESHOLD = settings.LOOP_BLOCK_THRESHOLD  # seconds
+LOOP_BLOCK_STACK_LIMIT = 20  # frames
+PROFILE_PATH = "/profile"
+PROFILE_CONTENT_TYPE = "text/plain; charset=utf-8"
+PROFILE_DEFAULT_SECONDS = 5
+PROFILE_MAX_SECONDS = 60
+PROFILE_INTERVAL = 0.005  # seconds between samples
+PROFILE_MIN_INTERVAL = 0.001  # seconds
+
+
+# OTLP span kinds and status codes.
+class SPAN_KINDS(int, Enum):
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+class SPAN_STATUS_CODES(int, Enum):
+    UNSET = 0
+    OK = 1
+    ERROR = 2
+
+
+class SPAN_NAMES(str, Enum):
+    WS_CONNECT = "ws.connect"
+    WS_ACTION = "ws.action"
+    SESSION_OPEN = "session.open"
+    SESSION_LOAD = "session.load"
+    SESSION_REFRESH = "session.refresh"
+    SESSION_FLUSH = "session.flush"
+    SEND_CONTEXT = "send_context"
+    RATE_LIMIT = "rate_limit"
+    CONTEXT_DECODE = "context.decode"
+    CONTEXT_PARSE = "context.parse"
+    ARCHIVE = "archive"
+    REDIS = "redis"
+    PROVIDER_CALL = "provider.call"
+    PROVIDER_FIRST_CHUNK = "provider.first_chunk"
@@ -1,6 +1,33 @@
 from enum import Enum
+from core.setting import settings
 
 ACTIVE_TYPES = "send_message", "switch_model"
+# Answered by the reader right away instead of waiting behind queued actions.
+IMMEDIATE_TYPES = "current_model", "load_history", "cancel", "ping", "pong"
+# Keep a connection alive without counting as activity for the idle timeout.
+LIVENESS_TYPES = "ping", "pong"
+# Only these can be aborted by a cancel action.
+CANCELLABLE_TYPES = ("send_message",)
+STREAM_MIN_CHUNK_SIZE = 32  # characters
+STREAM_FLUSH_INTERVAL = 0.05  # seconds
+WS_SEND_QUEUE_SIZE = settings.WS_SEND_QUEUE_SIZE  # frames per connection
+WS_SEND_QUEUE_POLICY = settings.WS_SEND_QUEUE_POLICY
+WS_CLOSE_TIMEOUT = settings.WS_CLOSE_TIMEOUT  # seconds to drain before closing
+WS_ACTION_QUEUE_SIZE = settings.WS_ACTION_QUEUE_SIZE  # actions waiting per connection
+WS_MAX_CONNECTIONS = settings.WS_MAX_CONNECTIONS  # per worker, 0 = unlimited
+WS_IDLE_TIMEOUT = settings.WS_IDLE_TIMEOUT  # seconds without an action, 0 = never
+WS_PING_INTERVAL = (
+    settings.WS_PING_INTERVAL
+)  # seconds of silence before a ping, 0 = off
+WS_PONG_TIMEOUT = settings.WS_PONG_TIMEOUT  # seconds to answer a ping
+WS_REAP_INTERVAL = settings.WS_REAP_INTERVAL  # seconds between idle sweeps
+SESSION_STATE_PATH = "/sessions"
+CONTEXT_PAGE_SIZE = settings.CONTEXT_PAGE_SIZE  # messages per history page
+CONTEXT_MAX_PAGE_SIZE = settings.CONTEXT_MAX_PAGE_SIZE
+CLUSTER_ENABLED = settings.CLUSTER_ENABLED
+CLUSTER_NODE_ID = settings.CLUSTER_NODE_ID
+CLUSTER_HEARTBEAT_INTERVAL = settings.CLUSTER_HEARTBEAT_INTERVAL  # seconds
+CLUSTER_NODE_TTL = settings.CLUSTER_NODE_TTL  # seconds without a heartbeat
 
 
 class WS_KEYS(str, Enum):
@@ -15,6 +42,9 @@ class AI_WS_SEND_KEYS(str, Enum):
     MESSAGES = "messages"
     ID = "id"
     PROMPT = "prompt"
+    RESET = "reset"
+    CURSOR = "cursor"
+    HAS_MORE = "has_more"
 
 
 class AI_WS_ACTION_TYPE(str, Enum):
@@ -23,6 +53,10 @@ class AI_WS_ACTION_TYPE(str, Enum):
     NEW_CONTEXT = "new_context"
     SET_CURRENT_MODEL = "set_current_model"
     CURRENT_MODEL = "current_model"
+    LOAD_HISTORY = "load_history"
+    CANCEL = "cancel"
+    PING = "ping"
+    PONG = "pong"
 
 
 class AI_WS_MESSAGE_TYPE(str, Enum):
@@ -33,3 +67,31 @@ class AI_WS_MESSAGE_TYPE(str, Enum):
     CONTEXT = "context"
     PARTIAL_MESSAGE = "partial_message"
     CURRENT_MODEL = "current_model"
+    CONTEXT_SYNC = "context_sync"
+    HISTORY = "history"
+    PING = "ping"
+    PONG = "pong"
+
+
+class WS_CLOSE_CODES(int, Enum):
+    NORMAL = 1000
+    GOING_AWAY = 1001
+    TRY_AGAIN_LATER = 1013
+    SESSION_REPLACED = 4000
+
+
+class WS_SEND_QUEUE_POLICIES(str, Enum):
+    DROP = "drop"
+    DISCONNECT = "disconnect"
+
+
+class CLUSTER_ACTIONS(str, Enum):
+    SEND = "send"
+    CLOSE = "close"
+
+
+class CLUSTER_MESSAGE_KEYS(str, Enum):
+    ACTION = "action"
+    DEVICE_ID = "device_id"
+    CONNECTION_ID = "connection_id"
+    MESSAGE = "message"
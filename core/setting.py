@@ -1,4 +1,5 @@
 import os
+from typing import Dict, List
 from dotenv import find_dotenv, load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -35,6 +36,83 @@ class Settings(BaseSettings):
     ALLOWED_HOST_3: str
     ALLOWED_HOST_4: str
     PORT: int
+    ADMIN_TOKEN: str = ""
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    PROVIDER_MAX_CONCURRENCY: int = 50
+    PROVIDER_MAX_QUEUE: int = 200
+    PROVIDER_TIMEOUT: float = 30
+    PROVIDER_DEADLINE: float = 60
+    PROVIDER_MAX_RETRIES: int = 2
+    PROVIDER_RETRY_BASE_DELAY: float = 0.5
+    PROVIDER_RETRY_MAX_DELAY: float = 5
+    PROVIDER_BREAKER_THRESHOLD: int = 5
+    PROVIDER_BREAKER_RESET: float = 30
+    PROVIDER_FALLBACK: bool = False
+    PROVIDER_WARMUP: bool = False
+    RATE_LIMIT_COUNT: int = 5
+    RATE_LIMIT_PERIOD: int = 10
+    RATE_LIMIT_MODELS: Dict[str, List[int]] = {}
+    RATE_LIMIT_LOCAL_MAX_KEYS: int = 10000
+    CONTEXT_TOKEN_BUDGET: int = 4000
+    CONTEXT_TOKEN_BUDGET_MODELS: Dict[str, int] = {}
+    CONTEXT_SUMMARY_TOKEN_BUDGET: int = 500
+    CONTEXT_FLUSH_DELAY: float = 0.5
+    CONTEXT_MAX_UNFLUSHED_MESSAGES: int = 10
+    CONTEXT_CODEC: str = "json"
+    CONTEXT_COMPRESSION: str = "none"
+    CONTEXT_COMPRESSION_THRESHOLD: int = 512
+    CONTEXT_ARCHIVE_ENABLED: bool = False
+    CONTEXT_ARCHIVE_PATH: str = "./data/archive.sqlite3"
+    CONTEXT_HOT_TURNS: int = 20
+    CONTEXT_ARCHIVE_RETENTION: float = 2592000
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_TTL: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_LOCAL_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_WINDOW: int = 2
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_REDIS: bool = False
+    SINGLE_FLIGHT_LOCK_TTL: float = 60
+    SINGLE_FLIGHT_RESULT_TTL: float = 1
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.05
+    METRICS_ENABLED: bool = True
+    TRACING_ENABLED: bool = True
+    TRACE_SLOW_THRESHOLD: float = 5
+    TRACE_FILE_PATH: str = "./data/traces.jsonl"
+    TRACE_FILE_MAX_BYTES: int = 10485760
+    TRACE_FILE_BACKUPS: int = 5
+    LOOP_LAG_INTERVAL: float = 0.1
+    LOOP_BLOCK_THRESHOLD: float = 0.25
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_QUEUE_POLICY: str = "disconnect"
+    WS_CLOSE_TIMEOUT: float = 1
+    WS_ACTION_QUEUE_SIZE: int = 16
+    CONTEXT_PAGE_SIZE: int = 50
+    CONTEXT_MAX_PAGE_SIZE: int = 200
+    WS_MAX_CONNECTIONS: int = 10000
+    WS_IDLE_TIMEOUT: float = 900
+    WS_PING_INTERVAL: float = 0
+    WS_PONG_TIMEOUT: float = 20
+    WS_REAP_INTERVAL: float = 5
+    BATCH_CONCURRENCY: int = 4
+    BATCH_RATE: float = 0
+    BATCH_WINDOW: int = 64
+    BATCH_CHECKPOINT_EVERY: int = 50
+    BATCH_TOKEN: str = ""
+    CLUSTER_ENABLED: bool = False
+    CLUSTER_NODE_ID: str = ""
+    CLUSTER_HEARTBEAT_INTERVAL: float = 5
+    CLUSTER_NODE_TTL: float = 15
+    SERVER_WORKERS: int = 1
+    SERVER_LOOP: str = "auto"
+    SERVER_HTTP: str = "auto"
+    SERVER_BACKLOG: int = 2048
+    SERVER_KEEP_ALIVE: float = 5
+    WS_MAX_SIZE: int = 1048576
+    WS_PROTOCOL_PING_INTERVAL: float = 20
+    WS_PROTOCOL_PING_TIMEOUT: float = 20
+    WS_COMPRESSION: bool = True
 
     class Config:
         env_file = dotenv_path
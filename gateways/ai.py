@@ -1,20 +1,182 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
-from constants.websocket import AI_WS_ACTION_TYPE, WS_KEYS
-from utils.websocket import webSocketManager
+from constants.ai import AI_MODELS
+from constants.redis import AI_REDIS_DATA_KEYS
+from constants.tracing import SPAN_NAMES
+from constants.websocket import (
+    AI_WS_ACTION_TYPE,
+    AI_WS_MESSAGE_TYPE,
+    AI_WS_SEND_KEYS,
+    CANCELLABLE_TYPES,
+    IMMEDIATE_TYPES,
+    WS_ACTION_QUEUE_SIZE,
+    WS_KEYS,
+)
+from utils.websocket import Connection, webSocketManager
 from utils.redis import redisManager
 from redis.asyncio import Redis
 from services.ai import (
     generate_initial_conversation,
     handle_beginning_conversation,
     handle_current_model,
+    handle_load_history,
     handle_rate_limit,
     handle_send_message,
     handle_set_current_model,
     handle_switch_model,
 )
+from services.session import ContextSession, contextSessionManager
 from utils.logger import logger
+from utils.metrics import track_redis_round_trips
+from utils.tracing import tracer
 
 router = APIRouter()
+ws_actions = {action.value for action in AI_WS_ACTION_TYPE}
+
+
+def get_action(data: dict) -> str:
+    return data.get(f"{WS_KEYS.ACTION.value}", AI_WS_ACTION_TYPE.SEND_MESSAGE.value)
+
+
+class ActionWorker:
+    # Runs queued actions one at a time in arrival order, while the reader
+    # keeps serving the socket. The running action is its own task so that a
+    # cancel action can abort it without stopping the worker.
+    def __init__(self, handle: Callable[[dict], Awaitable[bool]]):
+        self.handle = handle
+        self.queue: asyncio.Queue = asyncio.Queue(WS_ACTION_QUEUE_SIZE)
+        self.current: Optional[asyncio.Task] = None
+        self.current_action: Optional[str] = None
+        self.cancel_requested = False
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            data = await self.queue.get()
+            self.current_action = get_action(data)
+            self.cancel_requested = False
+            self.current = asyncio.create_task(self.handle(data))
+            try:
+                await asyncio.wait({self.current})
+                if self.current.cancelled():
+                    continue
+                if not self.current.result():
+                    return
+            finally:
+                self.current, self.current_action = None, None
+
+    def cancel(self) -> bool:
+        if self.current is None or self.current_action not in CANCELLABLE_TYPES:
+            return False
+        self.cancel_requested = True
+        return self.current.cancel()
+
+    async def stop(self):
+        tasks = [task for task in (self.task, self.current) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def handle_action(
+    connection: Connection,
+    locale: str,
+    device_id: str,
+    session: ContextSession,
+    data: dict,
+    redis: Redis,
+    cancel_requested: Callable[[], bool],
+) -> bool:
+    action = get_action(data)
+    action = action if action in ws_actions else "unknown"
+    with (
+        track_redis_round_trips(action=action),
+        tracer.trace(SPAN_NAMES.WS_ACTION.value, action=action, device_id=device_id),
+    ):
+        if action not in IMMEDIATE_TYPES:
+            # Immediate actions run beside a queued one, so only the worker
+            # may swap the session's context underneath it.
+            with tracer.span(SPAN_NAMES.SESSION_REFRESH.value):
+                await session.refresh()
+        with tracer.span(SPAN_NAMES.RATE_LIMIT.value):
+            allowed = await handle_rate_limit(
+                connection=connection,
+                locale=locale,
+                device_id=device_id,
+                session=session,
+                model=(
+                    data.get(
+                        f"{AI_REDIS_DATA_KEYS.MODEL.value}", AI_MODELS.CHATGPT.value
+                    )
+                    if action == AI_WS_ACTION_TYPE.SEND_MESSAGE.value
+                    else None
+                ),
+                redis=redis,
+            )
+        if not allowed:
+            return False
+
+        match action:
+            case AI_WS_ACTION_TYPE.SEND_MESSAGE.value:
+                await handle_send_message(
+                    connection=connection,
+                    locale=locale,
+                    session=session,
+                    data=data,
+                    redis=redis,
+                    cancel_requested=cancel_requested,
+                )
+            case AI_WS_ACTION_TYPE.SWITCH_MODEL.value:
+                await handle_switch_model(
+                    connection=connection,
+                    locale=locale,
+                    session=session,
+                    data=data,
+                )
+            case AI_WS_ACTION_TYPE.NEW_CONTEXT.value:
+                await generate_initial_conversation(
+                    connection=connection, locale=locale, session=session
+                )
+            case AI_WS_ACTION_TYPE.SET_CURRENT_MODEL.value:
+                await handle_set_current_model(session=session, data=data)
+            case AI_WS_ACTION_TYPE.CURRENT_MODEL.value:
+                await handle_current_model(connection=connection, session=session)
+            case AI_WS_ACTION_TYPE.LOAD_HISTORY.value:
+                await handle_load_history(
+                    connection=connection, session=session, data=data
+                )
+    return True
+
+
+async def read_actions(
+    connection: Connection,
+    worker: ActionWorker,
+    handle: Callable[[dict], Awaitable[bool]],
+):
+    # Ordering: queued actions run one at a time in arrival order; current_model
+    # and load_history are answered right away against the state of the last
+    # finished action; a cancel aborts the running send_message, if any, and
+    # leaves the queue as is.
+    while True:
+        data = await connection.receive_json()
+        match get_action(data):
+            case AI_WS_ACTION_TYPE.PING.value:
+                await connection.send_json(
+                    {f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.PONG.value}
+                )
+            case AI_WS_ACTION_TYPE.PONG.value:
+                pass
+            case AI_WS_ACTION_TYPE.CANCEL.value:
+                worker.cancel()
+            case (
+                AI_WS_ACTION_TYPE.CURRENT_MODEL.value
+                | AI_WS_ACTION_TYPE.LOAD_HISTORY.value
+            ):
+                if not await handle(data):
+                    return
+            case _:
+                await worker.queue.put(data)
 
 
 @router.websocket("/ws/{locale}/{device_id}")
@@ -22,79 +184,70 @@ async def websocket_endpoint(
     websocket: WebSocket,
     locale: str,
     device_id: str,
+    last_message_id: Optional[str] = None,
+    page_size: Optional[int] = None,
     redis: Redis = Depends(redisManager.get_redis),
 ):
-    await webSocketManager.connect(websocket, device_id)
+    connection = await webSocketManager.connect(websocket, device_id)
+    if connection is None:
+        return
     context_key = f"{WS_KEYS.CONTEXT.value}:{device_id}"
-    context_data = await redis.get(context_key)
+    session = ContextSession(context_key=context_key, redis=redis)
 
-    if context_data:
-        await handle_beginning_conversation(
-            websocket=websocket,
+    def handle(data: dict) -> Awaitable[bool]:
+        return handle_action(
+            connection=connection,
             locale=locale,
-            context_key=context_key,
-            context_data=context_data,
+            device_id=device_id,
+            session=session,
+            data=data,
             redis=redis,
-        )
-    else:
-        await generate_initial_conversation(
-            websocket=websocket, locale=locale, context_key=context_key, redis=redis
+            cancel_requested=lambda: worker is not None and worker.cancel_requested,
         )
 
+    worker: Optional[ActionWorker] = None
+    tasks = []
+    # Everything after connect() runs inside the try so that no error can
+    # leave the connection, session or worker behind.
     try:
-        while True:
-
-            await handle_rate_limit(
-                websocket=websocket,
-                locale=locale,
-                device_id=device_id,
-                context_key=context_key,
-                context_data=context_data,
-                redis=redis,
-            )
-
-            data = await websocket.receive_json()
-            action = data.get(
-                f"{WS_KEYS.ACTION.value}", AI_WS_ACTION_TYPE.SEND_MESSAGE.value
-            )
-
-            match action:
-                case AI_WS_ACTION_TYPE.SEND_MESSAGE.value:
-                    await handle_send_message(
-                        websocket=websocket,
-                        locale=locale,
-                        context_key=context_key,
-                        data=data,
-                        redis=redis,
-                    )
-                case AI_WS_ACTION_TYPE.SWITCH_MODEL.value:
-                    await handle_switch_model(
-                        websocket=websocket,
+        with tracer.trace(SPAN_NAMES.WS_CONNECT.value, device_id=device_id):
+            with tracer.span(SPAN_NAMES.SESSION_OPEN.value):
+                await contextSessionManager.open(session)
+            with tracer.span(SPAN_NAMES.SESSION_LOAD.value):
+                context = await session.load()
+            with tracer.span(SPAN_NAMES.SEND_CONTEXT.value):
+                if context:
+                    await handle_beginning_conversation(
+                        connection=connection,
                         locale=locale,
-                        context_key=context_key,
-                        data=data,
-                        redis=redis,
+                        session=session,
+                        last_message_id=last_message_id,
+                        page_size=page_size,
                     )
-                case AI_WS_ACTION_TYPE.NEW_CONTEXT.value:
+                else:
                     await generate_initial_conversation(
-                        websocket=websocket,
-                        locale=locale,
-                        context_key=context_key,
-                        redis=redis,
-                    )
-                case AI_WS_ACTION_TYPE.SET_CURRENT_MODEL.value:
-                    await handle_set_current_model(
-                        context_key=context_key,
-                        data=data,
-                        redis=redis,
-                    )
-                case AI_WS_ACTION_TYPE.CURRENT_MODEL.value:
-                    await handle_current_model(
-                        websocket=websocket,
-                        context_key=context_key,
-                        redis=redis,
+                        connection=connection, locale=locale, session=session
                     )
 
+        worker = ActionWorker(handle=handle)
+        tasks = [
+            asyncio.create_task(read_actions(connection, worker, handle)),
+            asyncio.create_task(connection.closed.wait()),
+            worker.task,
+        ]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+
     except WebSocketDisconnect:
-        webSocketManager.disconnect(device_id)
         logger.info(f"Websocket disconnected: {device_id}")
+    except Exception:
+        logger.exception(f"Websocket session failed: {device_id}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        if worker is not None:
+            await worker.stop()
+        await webSocketManager.disconnect(connection)
+        contextSessionManager.close(session)
+        await session.close()
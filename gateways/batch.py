@@ -0,0 +1,69 @@
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from constants.batch import (
+    BATCH_CONCURRENCY,
+    BATCH_MEDIA_TYPE,
+    BATCH_PATH,
+    BATCH_RATE,
+    BATCH_SPOOL_SIZE,
+    BATCH_TOKEN,
+    BATCH_WINDOW,
+)
+from services.batch import BatchRunner, batchProviderRouter
+from utils.auth import require_token
+from utils.codec import json_dumps
+
+router = APIRouter()
+
+
+async def spool_body(request: Request) -> SpooledTemporaryFile:
+    # The body is read in full before the response starts: the streaming
+    # response listens for a disconnect on the same receive channel and would
+    # swallow body chunks still arriving. Past BATCH_SPOOL_SIZE it goes to
+    # disk, so a large upload does not sit in memory.
+    body = SpooledTemporaryFile(max_size=BATCH_SPOOL_SIZE)
+    async for chunk in request.stream():
+        body.write(chunk)
+    body.seek(0)
+    return body
+
+
+async def read_lines(body: SpooledTemporaryFile) -> AsyncIterator[str]:
+    for line in body:
+        yield line.decode("utf-8", errors="replace")
+
+
+def clamp_rate(rate: float) -> float:
+    # A rate of 0 means no limit, so with a configured limit it cannot be
+    # asked for.
+    if not BATCH_RATE:
+        return max(rate, 0)
+    return min(rate, BATCH_RATE) if rate > 0 else BATCH_RATE
+
+
+@router.post(BATCH_PATH, dependencies=[Depends(require_token(BATCH_TOKEN))])
+async def batch_endpoint(
+    request: Request,
+    start: int = 0,
+    concurrency: int = BATCH_CONCURRENCY,
+    rate: float = BATCH_RATE,
+    window: Optional[int] = None,
+):
+    runner = BatchRunner(
+        router=batchProviderRouter,
+        concurrency=min(concurrency, BATCH_CONCURRENCY),
+        rate=clamp_rate(rate),
+        window=min(window or BATCH_WINDOW, BATCH_WINDOW),
+    )
+    body = await spool_body(request)
+
+    async def results() -> AsyncIterator[bytes]:
+        try:
+            async for result in runner.run(read_lines(body), start=start):
+                yield json_dumps(result) + b"\n"
+        finally:
+            body.close()
+
+    return StreamingResponse(results(), media_type=BATCH_MEDIA_TYPE)
@@ -1,27 +1,68 @@
+import asyncio
 from contextlib import asynccontextmanager
-import uvicorn
-from fastapi import FastAPI
-from gateways import ai
+from fastapi import Depends, FastAPI, Response
+from gateways import ai, batch
+from services.archive import contextArchive
+from services.session import contextSessionManager
 from utils.redis import redisManager
+from utils.ai import aiClientManager
+from utils.i18n import translationRegistry
 from fastapi.middleware.cors import CORSMiddleware
 from constants.base import (
+    ADMIN_TOKEN,
     ALLOWED_HEADERS,
     ALLOWED_METHODS,
-    HOST,
     MODULE,
     ORIGINS,
-    PORT,
     PREFIX,
 )
+from constants.ai import PROVIDER_STATE_PATH, PROVIDER_WARMUP
+from constants.metrics import METRICS_CONTENT_TYPE, METRICS_PATH
+from constants.tracing import (
+    PROFILE_CONTENT_TYPE,
+    PROFILE_DEFAULT_SECONDS,
+    PROFILE_INTERVAL,
+    PROFILE_MAX_SECONDS,
+    PROFILE_PATH,
+)
+from constants.websocket import SESSION_STATE_PATH
+from utils.auth import require_token
 from utils.logger import logger
+from utils.metrics import get_resident_memory, metricsRegistry
+from utils.profiling import ProfilerBusy, loopMonitor, samplingProfiler
+from utils.router import providerRouter
+from utils.tracing import tracer
+from utils.server import run_server
+from utils.websocket import webSocketManager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     app.state.redis = await redisManager.check_redis_connection()
+    translationRegistry.load()
+    loopMonitor.start()
+    invalidation_listener = asyncio.create_task(
+        contextSessionManager.listen(redisManager.get_redis())
+    )
+    await webSocketManager.start(redisManager.get_redis())
+    archive_pruning = (
+        asyncio.create_task(contextArchive.run_pruning())
+        if contextArchive.enabled
+        else None
+    )
+    if PROVIDER_WARMUP:
+        await aiClientManager.warmup()
     yield
     # Shutdown
+    invalidation_listener.cancel()
+    if archive_pruning is not None:
+        archive_pruning.cancel()
+    await webSocketManager.stop()
+    loopMonitor.stop()
+    tracer.exporter.stop()
+    await aiClientManager.close()
+    contextArchive.close()
     app.state.shutdown = logger.info("Shutting down...")
 
 
@@ -35,7 +76,52 @@ app.add_middleware(
     allow_headers=ALLOWED_HEADERS,
 )
 
+# Debug endpoints expose device ids and can start the profiler.
+admin_dependencies = [Depends(require_token(ADMIN_TOKEN))]
+
 app.include_router(ai.router, prefix=PREFIX)
+app.include_router(batch.router, prefix=PREFIX)
+
+
+@app.get(METRICS_PATH, include_in_schema=False)
+async def metrics():
+    return Response(content=metricsRegistry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get(PROVIDER_STATE_PATH, include_in_schema=False, dependencies=admin_dependencies)
+async def providers():
+    return providerRouter.snapshot()
+
+
+@app.get(SESSION_STATE_PATH, include_in_schema=False, dependencies=admin_dependencies)
+async def sessions():
+    connections = webSocketManager.snapshot()
+    resident_memory = get_resident_memory()
+    return {
+        "resident_memory_bytes": resident_memory,
+        "resident_memory_per_connection": (
+            resident_memory // connections["connections"]
+            if resident_memory and connections["connections"]
+            else None
+        ),
+        "connections": connections,
+        "contexts": contextSessionManager.snapshot(),
+    }
+
+
+@app.get(PROFILE_PATH, include_in_schema=False, dependencies=admin_dependencies)
+async def profile(
+    seconds: float = PROFILE_DEFAULT_SECONDS, interval: float = PROFILE_INTERVAL
+):
+    # Folded stacks of the live process, ready for flamegraph.pl or speedscope.
+    try:
+        stacks = await samplingProfiler.profile(
+            seconds=min(max(seconds, 0), PROFILE_MAX_SECONDS), interval=interval
+        )
+    except ProfilerBusy as e:
+        return Response(content=str(e), status_code=409)
+    return Response(content=stacks, media_type=PROFILE_CONTENT_TYPE)
+
 
 if __name__ == MODULE:
-    uvicorn.run(app, host=HOST, port=PORT)
+    run_server(app=app)
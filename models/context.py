@@ -7,3 +7,7 @@ class Context(BaseModel):
     id: str
     messages: List[Message]
     current_model: Optional[str] = None
+    summary: Optional[str] = None
+    summary_count: int = 0
+    archived_count: int = 0
+    version: int = 0
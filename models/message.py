@@ -1,6 +1,8 @@
 from pydantic import BaseModel
+from typing import Optional
 
 
 class Message(BaseModel):
     id: str
     prompt: str
+    role: Optional[str] = None
@@ -1,32 +1,57 @@
-# import asyncio
-from collections import defaultdict
+import asyncio
+from contextlib import aclosing, contextmanager
+import sqlite3
 import time
+from typing import AsyncIterator, Callable, List, Optional, Tuple
 import uuid
 from constants.ai import (
-    AI_API_KEYS,
     AI_MODEL_NAMES,
     AI_MODELS,
     AI_QUERY_MODELS,
-    GEMINI_CONTEXT_MESSAGE_KEYS,
-    GEMINI_ROLES,
     GPT_CONTEXT_MESSAGE_KEYS,
     GPT_DEFAULT_CONTENT,
     GPT_ROLES,
 )
-from constants.base import RATE_LIMIT_COUNT, RATE_LIMIT_PERIOD, SYSTEM_ROLES
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
 from constants.i18n import TRANSLATION_KEYS
-from constants.redis import AI_REDIS_DATA_KEYS, CONTEXT_EXPIRE_TIME
-from constants.websocket import AI_WS_MESSAGE_TYPE, AI_WS_SEND_KEYS
-from fastapi import Depends, WebSocket
+from constants.metrics import MESSAGE_STAGES
+from constants.redis import AI_REDIS_DATA_KEYS
+from constants.websocket import (
+    AI_WS_MESSAGE_TYPE,
+    AI_WS_SEND_KEYS,
+    CONTEXT_MAX_PAGE_SIZE,
+    CONTEXT_PAGE_SIZE,
+    STREAM_FLUSH_INTERVAL,
+    STREAM_MIN_CHUNK_SIZE,
+)
+from fastapi import Depends
 from redis import Redis
 from models.context import Context
 from models.message import Message
+from services.archive import contextArchive
+from services.context_window import build_context_window, estimate_tokens
+from services.messages import (
+    MessageCache,
+    messageCache,
+    serialize_message,
+    serialize_summary,
+)
+from services.session import ContextSession
 from utils.redis import redisManager
-import openai
-import google.generativeai as genai
+from utils.ai import aiClientManager
+from utils.cache import responseCache
+from utils.metrics import (
+    message_stage_seconds,
+    provider_request_seconds,
+    rate_limit_rejections_total,
+)
+from utils.rate_limit import rateLimiter
+from utils.router import providerRouter
+from utils.single_flight import singleFlight
+from utils.tracing import tracer
+from utils.websocket import Connection
 from utils.i18n import t
-
-rate_limit_data = defaultdict(list)
+from utils.logger import logger
 
 ai_mapper = {
     AI_MODELS.CHATGPT.value: AI_MODEL_NAMES.CHATGPT.value,
@@ -38,88 +63,150 @@ ai_translation_key_mapper = {
 }
 
 
+@contextmanager
+def track_stage(stage: str, **attributes):
+    with message_stage_seconds.time(stage=stage), tracer.span(stage, **attributes):
+        yield
+
+
 async def handle_rate_limit(
-    websocket: WebSocket,
+    connection: Connection,
     locale: str,
     device_id: str,
-    context_key: str,
-    context_data: Context,
+    session: ContextSession,
+    model: Optional[str] = None,
     redis: Redis = Depends(redisManager.get_redis),
-):
-    current_time = time.time()
-    rate_limit_data[device_id] = [
-        timestamp
-        for timestamp in rate_limit_data[device_id]
-        if current_time - timestamp < RATE_LIMIT_PERIOD
-    ]
-
-    if len(rate_limit_data[device_id]) >= RATE_LIMIT_COUNT:
-        context = Context.parse_raw(context_data)
-        locale_message = t(locale, TRANSLATION_KEYS.RATE_LIMIT.value)
-        message = Message(
-            id=str(uuid.uuid4()),
-            prompt=locale_message,
-        )
-        context.messages.append(message)
-        await websocket.send_json(
-            {
-                f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.SYSTEM_MESSAGE.value,
-                f"{AI_WS_SEND_KEYS.DATA.value}": message.dict(),
-            }
-        )
-        await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
-        await websocket.close()
-
-    rate_limit_data[device_id].append(current_time)
+) -> bool:
+    if await rateLimiter.is_allowed(device_id=device_id, model=model, redis=redis):
+        return True
 
+    rate_limit_rejections_total.inc()
 
-async def query_openai(
-    prompt: str,
-    context_key: str,
-    redis: Redis = Depends(redisManager.get_redis),
-) -> str:
-    openai.api_key = AI_API_KEYS.OPENAI.value
-    context_messages = await generate_context_messages(
-        model=AI_MODELS.CHATGPT.value, context_key=context_key, redis=redis
+    locale_message = t(locale, TRANSLATION_KEYS.RATE_LIMIT.value)
+    message = Message(
+        id=str(uuid.uuid4()),
+        prompt=locale_message,
     )
-    response = openai.chat.completions.create(
+    await connection.send_json(
+        {
+            f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.SYSTEM_MESSAGE.value,
+            f"{AI_WS_SEND_KEYS.DATA.value}": message.dict(),
+        }
+    )
+    session.append(message)
+    await session.save()
+    await connection.close()
+    return False
+
+
+async def query_openai(context_messages: list) -> str:
+    client = await aiClientManager.get_openai()
+    response = await client.chat.completions.create(
         model=AI_QUERY_MODELS.OPENAI.value,
-        messages=context_messages
-        + [
-            {
-                f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": GPT_ROLES.USER.value,
-                f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": prompt,
-            },
-        ],
+        messages=context_messages,
     )
     return response.choices[0].message.content
 
 
-async def query_gemini(
-    prompt: str,
-    context_key: str,
-    redis: Redis = Depends(redisManager.get_redis),
-) -> str:
-    genai.configure(api_key=AI_API_KEYS.GEMINI.value)
-    model = genai.GenerativeModel(model_name=AI_QUERY_MODELS.GEMINI.value)
-    context_messages = await generate_context_messages(
-        model=AI_MODELS.GEMINI.value, context_key=context_key, redis=redis
+async def query_gemini(context_messages: list) -> str:
+    model = await aiClientManager.get_gemini()
+    response = await model.generate_content_async(context_messages)
+    return response.text
+
+
+async def stream_openai(context_messages: list) -> AsyncIterator[str]:
+    client = await aiClientManager.get_openai()
+    response = await client.chat.completions.create(
+        model=AI_QUERY_MODELS.OPENAI.value,
+        messages=context_messages,
+        stream=True,
     )
-    context_messages.append(
+    # Closing the response drops the HTTP stream, so an aborted generation
+    # stops being billed.
+    async with response:
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+async def stream_gemini(context_messages: list) -> AsyncIterator[str]:
+    model = await aiClientManager.get_gemini()
+    response = await model.generate_content_async(context_messages, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+query_mapper = {
+    AI_MODELS.CHATGPT.value: query_openai,
+    AI_MODELS.GEMINI.value: query_gemini,
+}
+stream_mapper = {
+    AI_MODELS.CHATGPT.value: stream_openai,
+    AI_MODELS.GEMINI.value: stream_gemini,
+}
+
+
+async def send_partial_messages(
+    connection: Connection,
+    message_id: str,
+    chunks: AsyncIterator[str],
+    response: List[str],
+) -> str:
+    buffer = []
+    buffer_size = 0
+    frames = 0
+    last_flush = time.monotonic()
+
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            response.append(chunk)
+            buffer.append(chunk)
+            buffer_size += len(chunk)
+            if (
+                frames == 0
+                or buffer_size >= STREAM_MIN_CHUNK_SIZE
+                or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL
+            ):
+                await send_partial_message(connection, message_id, "".join(buffer))
+                buffer.clear()
+                buffer_size = 0
+                frames += 1
+                last_flush = time.monotonic()
+
+    if buffer:
+        await send_partial_message(connection, message_id, "".join(buffer))
+    return "".join(response)
+
+
+async def send_partial_message(connection: Connection, message_id: str, prompt: str):
+    await connection.send_json(
         {
-            f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": GEMINI_ROLES.USER.value,
-            f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [prompt],
+            f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.PARTIAL_MESSAGE.value,
+            f"{AI_WS_SEND_KEYS.DATA.value}": {
+                f"{AI_WS_SEND_KEYS.ID.value}": message_id,
+                f"{AI_WS_SEND_KEYS.PROMPT.value}": prompt,
+            },
         }
     )
-    response = model.generate_content(context_messages)
-    return response.text
 
 
-async def generate_context_messages(
-    model: str, context_key: str, redis: Redis = Depends(redisManager.get_redis)
-):
-    context_data = await redis.get(context_key)
-    context = Context.parse_raw(context_data)
+def build_context_messages(
+    model: str, context: Context, cache: Optional[MessageCache] = messageCache
+) -> Tuple[list, str, int]:
+    reserved_tokens = (
+        estimate_tokens(GPT_DEFAULT_CONTENT) if model == AI_MODELS.CHATGPT.value else 0
+    )
+    messages, summary, dropped = build_context_window(
+        model=model,
+        messages=context.messages[
+            max(context.summary_count - context.archived_count, 0) :
+        ],
+        summary=context.summary,
+        reserved_tokens=reserved_tokens,
+        cache=cache,
+    )
+
     context_messages = (
         [
             {
@@ -130,64 +217,153 @@ async def generate_context_messages(
         if model == AI_MODELS.CHATGPT.value
         else []
     )
-    for msg in context.messages:
-        if msg.prompt.startswith(f"{SYSTEM_ROLES.USER.value}:"):
-            if model == AI_MODELS.CHATGPT.value:
-                context_messages.append(
-                    {
-                        f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": GPT_ROLES.USER.value,
-                        f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": msg.prompt.replace(
-                            f"{SYSTEM_ROLES.USER.value}:", ""
-                        ),
-                    }
-                )
-            elif model == AI_MODELS.GEMINI.value:
-                context_messages.append(
-                    {
-                        f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": GEMINI_ROLES.USER.value,
-                        f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [
-                            msg.prompt.replace(f"{SYSTEM_ROLES.USER.value}:", "")
-                        ],
-                    }
-                )
-        elif msg.prompt.startswith(f"{SYSTEM_ROLES.AI.value}:"):
-            if model == AI_MODELS.CHATGPT.value:
-                context_messages.append(
-                    {
-                        f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": GPT_ROLES.ASSISTANT.value,
-                        f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": msg.prompt.replace(
-                            f"{SYSTEM_ROLES.AI.value}:", ""
-                        ),
-                    }
-                )
-            elif model == AI_MODELS.GEMINI.value:
-                context_messages.append(
-                    {
-                        f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": GEMINI_ROLES.MODEL.value,
-                        f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [
-                            msg.prompt.replace(f"{SYSTEM_ROLES.AI.value}:", "")
-                        ],
-                    }
-                )
-        else:
-            continue
-    return context_messages
+    if summary:
+        context_messages.append(serialize_summary(model=model, summary=summary))
+    for message in messages:
+        payload = serialize_message(model=model, message=message, cache=cache)
+        if payload is not None:
+            context_messages.append(payload)
+    return context_messages, summary, dropped
+
+
+def commit_context_window(session: ContextSession, summary: str, dropped: int):
+    # The summary is only kept once the provider has answered, so a failed
+    # turn leaves the window as it was.
+    if dropped:
+        session.set_summary(
+            summary=summary, summary_count=session.context.summary_count + dropped
+        )
+
+
+def get_page_size(limit: Optional[int]) -> int:
+    return min(max(limit or CONTEXT_PAGE_SIZE, 1), CONTEXT_MAX_PAGE_SIZE)
+
+
+async def get_history_page(
+    session: ContextSession, before: Optional[str], limit: int
+) -> Tuple[List[Message], bool]:
+    # The turns in memory come first; anything older is read from the archive
+    # only when the client pages back that far.
+    context = session.context
+    messages = context.messages
+    archived_count = context.archived_count if contextArchive.enabled else 0
+    end = len(messages)
+    if before is not None:
+        end = next(
+            (index for index, message in enumerate(messages) if message.id == before),
+            None,
+        )
+    start = max(end - limit, 0) if end is not None else 0
+    page = messages[start:end] if end is not None else []
+    if start or not archived_count:
+        # An unknown cursor belongs to a context that has since been replaced.
+        return page, start > 0
+    if len(page) == limit:
+        return page, True
+
+    try:
+        position = (
+            archived_count
+            if end is not None
+            else await contextArchive.get_position(
+                context_key=session.context_key,
+                context_id=context.id,
+                message_id=before,
+            )
+        )
+        if position is None:
+            return [], False
+        older, has_more = await contextArchive.get_page(
+            context_key=session.context_key,
+            context_id=context.id,
+            before=position,
+            limit=limit - len(page),
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Context archive read failed: {e}")
+        return page, False
+    return older + page, has_more
+
+
+def build_history_page(messages: List[Message], has_more: bool) -> dict:
+    return {
+        f"{AI_WS_SEND_KEYS.MESSAGES.value}": [message.dict() for message in messages],
+        f"{AI_WS_SEND_KEYS.CURSOR.value}": messages[0].id if messages else None,
+        f"{AI_WS_SEND_KEYS.HAS_MORE.value}": has_more,
+    }
+
+
+async def handle_context_sync(
+    connection: Connection,
+    session: ContextSession,
+    last_message_id: Optional[str],
+    page_size: Optional[int],
+):
+    # Sends only what the client has not seen. An unknown id means the
+    # client's copy belongs to an older context, so it gets the latest page
+    # with reset set and pages further back with load_history.
+    messages = session.context.messages
+    index = next(
+        (
+            index
+            for index, message in enumerate(messages)
+            if message.id == last_message_id
+        ),
+        None,
+    )
+    if index is not None:
+        data = build_history_page(messages[index + 1 :], has_more=False)
+        data[f"{AI_WS_SEND_KEYS.CURSOR.value}"] = None
+    else:
+        data = build_history_page(
+            *await get_history_page(
+                session, before=None, limit=get_page_size(page_size)
+            )
+        )
+    data[f"{AI_WS_SEND_KEYS.RESET.value}"] = index is None
+    await connection.send_json(
+        {
+            f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CONTEXT_SYNC.value,
+            f"{AI_WS_SEND_KEYS.DATA.value}": data,
+        }
+    )
+
+
+async def handle_load_history(connection: Connection, session: ContextSession, data):
+    messages, has_more = await get_history_page(
+        session,
+        before=data.get(f"{AI_REDIS_DATA_KEYS.BEFORE.value}"),
+        limit=get_page_size(data.get(f"{AI_REDIS_DATA_KEYS.LIMIT.value}")),
+    )
+    await connection.send_json(
+        {
+            f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.HISTORY.value,
+            f"{AI_WS_SEND_KEYS.DATA.value}": build_history_page(messages, has_more),
+        }
+    )
 
 
 async def handle_beginning_conversation(
-    websocket: WebSocket,
+    connection: Connection,
     locale: str,
-    context_key: str,
-    context_data: Context,
-    redis: Redis = Depends(redisManager.get_redis),
+    session: ContextSession,
+    last_message_id: Optional[str] = None,
+    page_size: Optional[int] = None,
 ):
-    context = Context.parse_raw(context_data)
+    context = session.context
     if len(context.messages) == 1:
         await generate_initial_conversation(
-            websocket=websocket, locale=locale, context_key=context_key, redis=redis
+            connection=connection, locale=locale, session=session
+        )
+    elif last_message_id is not None or page_size is not None:
+        await handle_context_sync(
+            connection=connection,
+            session=session,
+            last_message_id=last_message_id,
+            page_size=page_size,
         )
     else:
-        await websocket.send_json(
+        await connection.send_json(
             {
                 f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CONTEXT.value,
                 f"{AI_WS_SEND_KEYS.DATA.value}": {
@@ -200,101 +376,179 @@ async def handle_beginning_conversation(
 
 
 async def handle_send_message(
-    websocket: WebSocket,
+    connection: Connection,
     locale: str,
-    context_key: str,
+    session: ContextSession,
     data,
     redis: Redis = Depends(redisManager.get_redis),
+    cancel_requested: Optional[Callable[[], bool]] = None,
 ):
-    context_data = await redis.get(context_key)
-    context = Context.parse_raw(context_data)
     model = data.get(f"{AI_REDIS_DATA_KEYS.MODEL.value}", AI_MODELS.CHATGPT.value)
     prompt = data.get(f"{AI_REDIS_DATA_KEYS.PROMT.value}", "").strip()
+    stream = data.get(f"{AI_REDIS_DATA_KEYS.STREAM.value}", False)
+    no_cache = data.get(f"{AI_REDIS_DATA_KEYS.NO_CACHE.value}", False)
 
     message = Message(
-        id=str(uuid.uuid4()), prompt=f"{SYSTEM_ROLES.USER.value}: {prompt}"
+        id=str(uuid.uuid4()),
+        prompt=f"{SYSTEM_ROLES.USER.value}: {prompt}",
+        role=MESSAGE_ROLES.USER.value,
     )
-    context.messages.append(message)
-    await websocket.send_json(
+    await connection.send_json(
         {
             f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CLIENT_MESSAGE.value,
             f"{AI_WS_SEND_KEYS.DATA.value}": message.dict(),
         }
     )
-    await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
+    session.append(message)
 
-    try:
-        if model == AI_MODELS.CHATGPT.value:
-            response = await query_openai(
-                prompt=prompt, context_key=context_key, redis=redis
+    ai_message_id = str(uuid.uuid4())
+    context_windows = {}
+    streamed = []
+    # Replies shared through single-flight or the cache count as the
+    # requested model's.
+    answered_model = model
+
+    def get_context_messages(candidate: str) -> list:
+        # Windows are built without touching the session, so each fallback
+        # candidate sees the same history; only the window of the model that
+        # answers has its summary kept.
+        if candidate not in context_windows:
+            context_windows[candidate] = build_context_messages(
+                model=candidate, context=session.context
             )
-        elif model == AI_MODELS.GEMINI.value:
-            response = await query_gemini(
-                prompt=prompt, context_key=context_key, redis=redis
+        return context_windows[candidate][0]
+
+    async def cache_response(answered_model: str, response: str):
+        if not no_cache and answered_model == model:
+            await responseCache.set(
+                model=model,
+                context_messages=get_context_messages(model),
+                response=response,
+                redis=redis,
             )
+
+    async def query() -> str:
+        nonlocal answered_model
+        answered_model, response = await providerRouter.query(
+            model,
+            lambda candidate: query_mapper[candidate](
+                context_messages=get_context_messages(candidate)
+            ),
+        )
+        await cache_response(answered_model, response)
+        return response
+
+    try:
+        with track_stage(MESSAGE_STAGES.BUILD_CONTEXT.value):
+            context_messages = get_context_messages(model)
+        with track_stage(MESSAGE_STAGES.CACHE_LOOKUP.value):
+            response = (
+                None
+                if no_cache
+                else await responseCache.get(
+                    model=model, context_messages=context_messages, redis=redis
+                )
+            )
+        if response is not None:
+            if stream:
+                await send_partial_message(connection, ai_message_id, response)
+        else:
+            model_label = model if model in query_mapper else "unknown"
+            with track_stage(
+                MESSAGE_STAGES.PROVIDER.value, model=model_label
+            ), provider_request_seconds.time(model=model_label):
+                if stream:
+                    answered_model, chunks = await providerRouter.stream(
+                        model,
+                        lambda candidate: stream_mapper[candidate](
+                            context_messages=get_context_messages(candidate)
+                        ),
+                    )
+                    response = await send_partial_messages(
+                        connection=connection,
+                        message_id=ai_message_id,
+                        chunks=chunks,
+                        response=streamed,
+                    )
+                    await cache_response(answered_model, response)
+                elif no_cache:
+                    response = await query()
+                else:
+                    # Devices sending the same turn at once share one call.
+                    response = await singleFlight.do(
+                        model=model,
+                        context_messages=context_messages,
+                        call=query,
+                        redis=redis,
+                    )
+    except asyncio.CancelledError:
+        # Only a cancel action keeps the turn; a disconnect or shutdown goes on
+        # cancelling. The text streamed so far is stored so the turn matches
+        # what the client has seen, and nothing is stored if nothing was.
+        if cancel_requested is None or not cancel_requested():
+            raise
+        response = "".join(streamed)
+        if not response:
+            return
     except Exception:
+        answered_model = None
         response = t(locale, TRANSLATION_KEYS.UNAVAILABLE_MODEL.value)
 
+    if answered_model in context_windows:
+        _, summary, dropped = context_windows[answered_model]
+        commit_context_window(session, summary=summary, dropped=dropped)
+
     ai_message = Message(
-        id=str(uuid.uuid4()), prompt=f"{SYSTEM_ROLES.AI.value}: {response}"
+        id=ai_message_id,
+        prompt=f"{SYSTEM_ROLES.AI.value}: {response}",
+        role=MESSAGE_ROLES.AI.value,
     )
-    context.messages.append(ai_message)
-    await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
+    session.append(ai_message)
+    with track_stage(MESSAGE_STAGES.SAVE_CONTEXT.value):
+        await session.save()
 
-    # words = response.split()
-    # await send_by_token(websocket, ai_message.id, words)
-    await websocket.send_json(
-        {
-            f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.AI_MESSAGE.value,
-            f"{AI_WS_SEND_KEYS.DATA.value}": ai_message.dict(),
-        }
-    )
+    with track_stage(MESSAGE_STAGES.SEND_AI_MESSAGE.value):
+        await connection.send_json(
+            {
+                f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.AI_MESSAGE.value,
+                f"{AI_WS_SEND_KEYS.DATA.value}": ai_message.dict(),
+            }
+        )
 
 
 async def handle_switch_model(
-    websocket: WebSocket,
-    locale: str,
-    context_key: str,
-    data,
-    redis: Redis = Depends(redisManager.get_redis),
+    connection: Connection, locale: str, session: ContextSession, data
 ):
-    context_data = await redis.get(context_key)
     model = data.get(f"{AI_REDIS_DATA_KEYS.MODEL.value}", AI_MODELS.CHATGPT.value)
     locale_message = t(locale, ai_translation_key_mapper[ai_mapper[model]])
-    context = Context.parse_raw(context_data)
     message = Message(id=str(uuid.uuid4()), prompt=locale_message)
-    context.messages.append(message)
-    await websocket.send_json(
+    await connection.send_json(
         {
             f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.SWITCH_MODEL.value,
             f"{AI_WS_SEND_KEYS.DATA.value}": message.dict(),
         }
     )
-    await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
-    await handle_set_current_model(context_key=context_key, data=data, redis=redis)
+    session.append(message)
+    session.set_current_model(model)
+    await session.save()
 
 
 async def generate_initial_conversation(
-    websocket: WebSocket,
-    locale: str,
-    context_key: str,
-    redis: Redis = Depends(redisManager.get_redis),
+    connection: Connection, locale: str, session: ContextSession
 ):
-    context_data = await redis.get(context_key)
-    previous_context = Context.parse_raw(context_data) if context_data != None else None
     current_model = (
         AI_MODELS.CHATGPT.value
-        if previous_context == None
-        else previous_context.current_model
+        if session.context == None
+        else session.context.current_model
     )
-    await redis.delete(context_key)
     context = Context(id=str(uuid.uuid4()), messages=[])
     greeting = t(locale, TRANSLATION_KEYS.AI_GREETING.value)
     initial_message = Message(id=str(uuid.uuid4()), prompt=greeting)
     context.current_model = current_model
     context.messages.append(initial_message)
-    await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
-    await websocket.send_json(
+    session.replace(context)
+    await session.save()
+    await connection.send_json(
         {
             f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CONTEXT.value,
             f"{AI_WS_SEND_KEYS.DATA.value}": {
@@ -306,32 +560,16 @@ async def generate_initial_conversation(
     )
 
 
-async def handle_set_current_model(
-    context_key: str,
-    data: str,
-    redis: Redis = Depends(redisManager.get_redis),
-):
-    context_data = await redis.get(context_key)
-    context = Context.parse_raw(context_data)
+async def handle_set_current_model(session: ContextSession, data: str):
     model = data.get(f"{AI_REDIS_DATA_KEYS.MODEL.value}", AI_MODELS.CHATGPT.value)
-    if context.current_model != model:
-        context.current_model = model
-        await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
-    else:
-        pass
+    session.set_current_model(model)
+    await session.save()
 
 
-async def handle_current_model(
-    websocket: WebSocket,
-    context_key: str,
-    redis: Redis = Depends(redisManager.get_redis),
-):
-    context_data = await redis.get(context_key)
-    context = Context.parse_raw(context_data)
-    model = context.current_model
+async def handle_current_model(connection: Connection, session: ContextSession):
+    model = session.context.current_model
     if model == None:
-        context.current_model = AI_MODELS.CHATGPT.value
-        await websocket.send_json(
+        await connection.send_json(
             {
                 f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CURRENT_MODEL.value,
                 f"{AI_WS_SEND_KEYS.DATA.value}": {
@@ -339,9 +577,10 @@ async def handle_current_model(
                 },
             }
         )
-        await redis.set(context_key, context.json(), ex=CONTEXT_EXPIRE_TIME)
+        session.set_current_model(AI_MODELS.CHATGPT.value)
+        await session.save()
     else:
-        await websocket.send_json(
+        await connection.send_json(
             {
                 f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.CURRENT_MODEL.value,
                 f"{AI_WS_SEND_KEYS.DATA.value}": {
@@ -349,19 +588,3 @@ async def handle_current_model(
                 },
             }
         )
-
-
-# async def send_by_token(
-#     websocket: WebSocket, message_id: str, words: list[str], delay: float = 0.1
-# ):
-#     for word in words:
-#         await websocket.send_json(
-#             {
-#                 f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.PARTIAL_MESSAGE.value,
-#                 f"{AI_WS_SEND_KEYS.DATA.value}": {
-#                     f"{AI_WS_SEND_KEYS.ID.value}": message_id,
-#                     f"{AI_WS_SEND_KEYS.PROMPT.value}": word,
-#                 },
-#             }
-#         )
-#         await asyncio.sleep(delay)
@@ -0,0 +1,235 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from constants.archive import (
+    CONTEXT_ARCHIVE_BUSY_TIMEOUT,
+    CONTEXT_ARCHIVE_ENABLED,
+    CONTEXT_ARCHIVE_PATH,
+    CONTEXT_ARCHIVE_PRUNE_INTERVAL,
+    CONTEXT_ARCHIVE_RETENTION,
+)
+from models.context import Context
+from models.message import Message
+from services.context import decode_message, encode_message
+from services.context_window import summarize_messages
+from utils.logger import logger
+from utils.metrics import context_archived_messages_total
+
+# Every message is kept by device key, context id and its position in the
+# full history, so a page is a range scan on the primary key. The contexts
+# table holds the latest meta per device for restoring a context that has
+# expired from Redis.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    context_key TEXT PRIMARY KEY,
+    context_id TEXT NOT NULL,
+    current_model TEXT,
+    summary TEXT,
+    summary_count INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    context_key TEXT NOT NULL,
+    context_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (context_key, context_id, position)
+);
+CREATE INDEX IF NOT EXISTS messages_by_id ON messages (context_key, message_id);
+CREATE INDEX IF NOT EXISTS messages_by_age ON messages (created_at);
+"""
+
+
+class ContextArchive:
+    # Cold tier for conversation history. Redis keeps the last turns of each
+    # context, while every turn is also written here once it is in Redis, so
+    # older turns can be dropped from Redis and still be paged back. SQLite
+    # calls run in a worker thread, one at a time.
+    def __init__(self, path: str, enabled: bool):
+        self.path = path
+        self.enabled = enabled
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path,
+                timeout=CONTEXT_ARCHIVE_BUSY_TIMEOUT,
+                check_same_thread=False,
+            )
+            # WAL lets workers on the same host read while one of them writes.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(ARCHIVE_SCHEMA)
+            self.connection = connection
+        return self.connection
+
+    def execute(self, query: Callable[[sqlite3.Connection], object]):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                return query(connection)
+
+    async def run(self, query: Callable[[sqlite3.Connection], object]):
+        return await asyncio.to_thread(self.execute, query)
+
+    async def save(
+        self, context_key: str, context: Context, messages: List[Message], start: int
+    ):
+        now = time.time()
+        rows = [
+            (
+                context_key,
+                context.id,
+                start + index,
+                message.id,
+                encode_message(message),
+                now,
+            )
+            for index, message in enumerate(messages)
+        ]
+
+        def query(connection: sqlite3.Connection):
+            connection.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    context_key,
+                    context.id,
+                    context.current_model,
+                    context.summary,
+                    context.summary_count,
+                    now,
+                ),
+            )
+
+        await self.run(query)
+        context_archived_messages_total.inc(len(rows))
+
+    async def get_archived_count(self, context_key: str, context_id: str) -> int:
+        def query(connection: sqlite3.Connection) -> int:
+            row = connection.execute(
+                "SELECT MAX(position) FROM messages"
+                " WHERE context_key = ? AND context_id = ?",
+                (context_key, context_id),
+            ).fetchone()
+            return 0 if row[0] is None else row[0] + 1
+
+        return await self.run(query)
+
+    async def get_position(
+        self, context_key: str, context_id: str, message_id: str
+    ) -> Optional[int]:
+        def query(connection: sqlite3.Connection) -> Optional[int]:
+            row = connection.execute(
+                "SELECT position FROM messages"
+                " WHERE context_key = ? AND message_id = ? AND context_id = ?",
+                (context_key, message_id, context_id),
+            ).fetchone()
+            return None if row is None else row[0]
+
+        return await self.run(query)
+
+    async def get_page(
+        self, context_key: str, context_id: str, before: int, limit: int
+    ) -> Tuple[List[Message], bool]:
+        def query(connection: sqlite3.Connection) -> list:
+            return connection.execute(
+                "SELECT position, data FROM messages"
+                " WHERE context_key = ? AND context_id = ? AND position < ?"
+                " ORDER BY position DESC LIMIT ?",
+                (context_key, context_id, before, limit),
+            ).fetchall()
+
+        rows = await self.run(query)
+        rows.reverse()
+        # Retention prunes oldest first, so a full page that does not start at
+        # position 0 may have more before it.
+        has_more = bool(rows) and rows[0][0] > 0 and len(rows) == limit
+        return [decode_message(data) for _, data in rows], has_more
+
+    async def load(self, context_key: str, limit: int) -> Optional[Context]:
+        # Rebuilds a context that has expired from Redis: its meta and last
+        # `limit` messages, with everything older left in the archive.
+        def query(connection: sqlite3.Connection) -> Optional[tuple]:
+            meta = connection.execute(
+                "SELECT context_id, current_model, summary, summary_count"
+                " FROM contexts WHERE context_key = ?",
+                (context_key,),
+            ).fetchone()
+            if meta is None:
+                return None
+            rows = connection.execute(
+                "SELECT position, data FROM messages"
+                " WHERE context_key = ? AND context_id = ?"
+                " ORDER BY position DESC LIMIT ?",
+                (context_key, meta[0], limit),
+            ).fetchall()
+            return meta, rows
+
+        result = await self.run(query)
+        if result is None:
+            return None
+        (context_id, current_model, summary, summary_count), rows = result
+        rows.reverse()
+        archived_count = rows[0][0] if rows else 0
+        messages = [decode_message(data) for _, data in rows]
+        if archived_count > summary_count:
+            # The turns left behind were never summarized; keep them in view.
+            older, _ = await self.get_page(
+                context_key, context_id, archived_count, archived_count - summary_count
+            )
+            summary = summarize_messages(summary=summary, messages=older)
+            summary_count = archived_count
+        return Context(
+            id=context_id,
+            messages=messages,
+            current_model=current_model,
+            summary=summary,
+            summary_count=summary_count,
+            archived_count=archived_count,
+        )
+
+    async def prune(self, retention: float = CONTEXT_ARCHIVE_RETENTION) -> int:
+        cutoff = time.time() - retention
+
+        def query(connection: sqlite3.Connection) -> int:
+            deleted = connection.execute(
+                "DELETE FROM messages WHERE created_at < ?", (cutoff,)
+            ).rowcount
+            connection.execute("DELETE FROM contexts WHERE updated_at < ?", (cutoff,))
+            return deleted
+
+        return await self.run(query)
+
+    async def run_pruning(self):
+        while True:
+            try:
+                deleted = await self.prune()
+                if deleted:
+                    logger.info(f"Pruned {deleted} archived messages")
+            except sqlite3.Error as e:
+                logger.warning(f"Context archive pruning failed: {e}")
+            await asyncio.sleep(CONTEXT_ARCHIVE_PRUNE_INTERVAL)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+contextArchive = ContextArchive(
+    path=CONTEXT_ARCHIVE_PATH, enabled=CONTEXT_ARCHIVE_ENABLED
+)
@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+from collections import deque
+import os
+from typing import AsyncIterator, Deque, Dict, Iterable, Optional
+import uuid
+from constants.ai import AI_MODELS, PROVIDER_POOLS
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
+from constants.batch import (
+    BATCH_CHECKPOINT_EVERY,
+    BATCH_CHECKPOINT_KEYS,
+    BATCH_CHECKPOINT_SUFFIX,
+    BATCH_CONCURRENCY,
+    BATCH_DEFAULT_LOCALE,
+    BATCH_ERRORS,
+    BATCH_RATE,
+    BATCH_RECORD_KEYS,
+    BATCH_RESULT_KEYS,
+    BATCH_WINDOW,
+)
+from constants.i18n import TRANSLATION_KEYS
+from models.context import Context
+from models.message import Message
+from services.ai import build_context_messages, query_mapper
+from utils.ai import aiClientManager
+from utils.codec import json_dumps, json_loads
+from utils.i18n import t, translationRegistry
+from utils.logger import logger
+from utils.metrics import batch_records_total
+from utils.router import ProviderRouter
+
+system_roles = {
+    MESSAGE_ROLES.USER.value: SYSTEM_ROLES.USER.value,
+    MESSAGE_ROLES.AI.value: SYSTEM_ROLES.AI.value,
+}
+
+
+class RequestPacer:
+    # Spaces requests at least 1 / rate seconds apart; a rate of 0 lets every
+    # request through at once.
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_at = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        at = max(now, self.next_at)
+        self.next_at = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+def build_context(record: dict, prompt: str) -> Context:
+    messages = []
+    for item in record.get(f"{BATCH_RECORD_KEYS.HISTORY.value}") or []:
+        if not isinstance(item, dict):
+            continue
+        role = item.get(f"{BATCH_RECORD_KEYS.ROLE.value}")
+        if role not in system_roles:
+            continue
+        text = item.get(f"{BATCH_RECORD_KEYS.PROMPT.value}", "")
+        messages.append(
+            Message(
+                id=str(uuid.uuid4()), prompt=f"{system_roles[role]}: {text}", role=role
+            )
+        )
+    messages.append(
+        Message(
+            id=str(uuid.uuid4()),
+            prompt=f"{SYSTEM_ROLES.USER.value}: {prompt}",
+            role=MESSAGE_ROLES.USER.value,
+        )
+    )
+    return Context(id=str(uuid.uuid4()), messages=messages)
+
+
+def build_batch_router(concurrency: int) -> ProviderRouter:
+    return ProviderRouter(
+        [model.value for model in AI_MODELS],
+        pool=PROVIDER_POOLS.BATCH.value,
+        max_concurrency=concurrency,
+    )
+
+
+class BatchRunner:
+    # Runs batch records through the same context building, provider routing
+    # and fallbacks as the WebSocket path, without Redis, the response cache or
+    # single-flight. Calls go through a router of their own, so a batch cannot
+    # fill the queue the WebSocket path waits in. Results come out in input
+    # order, and at most `window` records are held at a time, so memory does
+    # not grow with the input.
+    def __init__(
+        self,
+        router: ProviderRouter,
+        concurrency: int = BATCH_CONCURRENCY,
+        rate: float = BATCH_RATE,
+        window: int = BATCH_WINDOW,
+    ):
+        self.router = router
+        self.window = max(window, 1)
+        self.limits: Dict[str, asyncio.Semaphore] = {
+            model: asyncio.Semaphore(max(concurrency, 1)) for model in query_mapper
+        }
+        self.pacers: Dict[str, RequestPacer] = {
+            model: RequestPacer(rate) for model in query_mapper
+        }
+
+    async def run(
+        self, lines: AsyncIterator[str], start: int = 0
+    ) -> AsyncIterator[dict]:
+        # Line numbers count every input line, blank ones included, so that a
+        # checkpoint can skip exactly the lines already answered.
+        pending: Deque[asyncio.Task] = deque()
+        line_number = 0
+        try:
+            async for line in lines:
+                line_number += 1
+                if line_number <= start or not line.strip():
+                    continue
+                pending.append(asyncio.create_task(self.run_line(line_number, line)))
+                while len(pending) >= self.window or (pending and pending[0].done()):
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def run_line(self, line_number: int, line: str) -> dict:
+        result = {f"{BATCH_RESULT_KEYS.LINE.value}": line_number}
+        try:
+            record = json_loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            result[f"{BATCH_RESULT_KEYS.ERROR.value}"] = BATCH_ERRORS.INVALID_JSON.value
+            batch_records_total.inc(model="unknown", result="error")
+            return result
+
+        model = record.get(f"{BATCH_RECORD_KEYS.MODEL.value}", AI_MODELS.CHATGPT.value)
+        prompt = str(record.get(f"{BATCH_RECORD_KEYS.PROMPT.value}") or "").strip()
+        locale = record.get(f"{BATCH_RECORD_KEYS.LOCALE.value}", BATCH_DEFAULT_LOCALE)
+        result[f"{BATCH_RESULT_KEYS.ID.value}"] = record.get(
+            f"{BATCH_RECORD_KEYS.ID.value}"
+        )
+        result[f"{BATCH_RESULT_KEYS.MODEL.value}"] = model
+        if not isinstance(model, str) or model not in query_mapper:
+            result[f"{BATCH_RESULT_KEYS.ERROR.value}"] = (
+                BATCH_ERRORS.UNKNOWN_MODEL.value
+            )
+            batch_records_total.inc(model="unknown", result="error")
+            return result
+        if not prompt:
+            result[f"{BATCH_RESULT_KEYS.ERROR.value}"] = (
+                BATCH_ERRORS.MISSING_PROMPT.value
+            )
+            batch_records_total.inc(model=model, result="error")
+            return result
+
+        context = build_context(record, prompt)
+        context_messages_mapper = {}
+
+        def get_context_messages(candidate: str) -> list:
+            if candidate not in context_messages_mapper:
+                # Batch messages are never seen again, so they stay out of
+                # the message cache that live sessions rely on.
+                context_messages_mapper[candidate], _, _ = build_context_messages(
+                    model=candidate, context=context, cache=None
+                )
+            return context_messages_mapper[candidate]
+
+        # The limits apply to the requested model; a fallback call is still
+        # bounded by the batch router's own per-provider concurrency.
+        async with self.limits[model]:
+            await self.pacers[model].wait()
+            try:
+                answered_model, response = await self.router.query(
+                    model,
+                    lambda candidate: query_mapper[candidate](
+                        context_messages=get_context_messages(candidate)
+                    ),
+                )
+            except Exception as e:
+                logger.warning(f"Batch line {line_number} failed: {e}")
+                result[f"{BATCH_RESULT_KEYS.RESPONSE.value}"] = t(
+                    locale, TRANSLATION_KEYS.UNAVAILABLE_MODEL.value
+                )
+                result[f"{BATCH_RESULT_KEYS.ERROR.value}"] = (
+                    BATCH_ERRORS.UNAVAILABLE.value
+                )
+                batch_records_total.inc(model=model, result="error")
+                return result
+
+        result[f"{BATCH_RESULT_KEYS.ANSWERED_MODEL.value}"] = answered_model
+        result[f"{BATCH_RESULT_KEYS.RESPONSE.value}"] = response
+        batch_records_total.inc(model=model, result="ok")
+        return result
+
+
+async def iterate_lines(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as checkpoint:
+            return json_loads(checkpoint.read())
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path: str, line: int, offset: int):
+    # Written aside and renamed, so a crash leaves the old checkpoint intact.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as checkpoint:
+        checkpoint.write(
+            json_dumps(
+                {
+                    f"{BATCH_CHECKPOINT_KEYS.LINE.value}": line,
+                    f"{BATCH_CHECKPOINT_KEYS.OFFSET.value}": offset,
+                }
+            )
+        )
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(tmp_path, path)
+
+
+async def run_file(
+    input_path: str,
+    output_path: str,
+    runner: BatchRunner,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = True,
+) -> int:
+    # The checkpoint records the last input line answered and the output size
+    # at that point. Resuming cuts off anything written after it and skips
+    # the lines already answered.
+    checkpoint_path = checkpoint_path or f"{output_path}{BATCH_CHECKPOINT_SUFFIX}"
+    checkpoint = (
+        read_checkpoint(checkpoint_path)
+        if resume and os.path.exists(output_path)
+        else None
+    )
+    start = checkpoint[f"{BATCH_CHECKPOINT_KEYS.LINE.value}"] if checkpoint else 0
+    offset = checkpoint[f"{BATCH_CHECKPOINT_KEYS.OFFSET.value}"] if checkpoint else 0
+    if start:
+        logger.info(f"Resuming batch after line {start}")
+
+    written = 0
+    line = start
+    with open(input_path, encoding="utf-8") as input_file, open(
+        output_path, "r+b" if checkpoint else "wb"
+    ) as output:
+        output.truncate(offset)
+        output.seek(offset)
+        async for result in runner.run(iterate_lines(input_file), start=start):
+            output.write(json_dumps(result) + b"\n")
+            line = result[f"{BATCH_RESULT_KEYS.LINE.value}"]
+            written += 1
+            if written % BATCH_CHECKPOINT_EVERY == 0:
+                output.flush()
+                os.fsync(output.fileno())
+                write_checkpoint(checkpoint_path, line, output.tell())
+        output.flush()
+        os.fsync(output.fileno())
+        write_checkpoint(checkpoint_path, line, output.tell())
+    return written
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Run a JSONL file of prompts through the assistant."
+    )
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=BATCH_RATE)
+    parser.add_argument("--window", type=int, default=BATCH_WINDOW)
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore an existing checkpoint."
+    )
+    args = parser.parse_args()
+
+    translationRegistry.load()
+    runner = BatchRunner(
+        router=build_batch_router(args.concurrency),
+        concurrency=args.concurrency,
+        rate=args.rate,
+        window=args.window,
+    )
+    try:
+        written = await run_file(
+            input_path=args.input,
+            output_path=args.output,
+            runner=runner,
+            checkpoint_path=args.checkpoint,
+            resume=not args.restart,
+        )
+    finally:
+        await aiClientManager.close()
+    logger.info(f"Batch wrote {written} records to {args.output}")
+
+
+batchProviderRouter = build_batch_router(BATCH_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
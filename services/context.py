@@ -0,0 +1,164 @@
+from typing import Dict, List, Optional
+from constants.tracing import SPAN_NAMES
+from constants.redis import (
+    CONTEXT_EXPIRE_TIME,
+    CONTEXT_META_FIELDS,
+    CONTEXT_REDIS_KEYS,
+)
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
+from models.context import Context
+from models.message import Message
+from utils.codec import contextCodec
+from utils.redis import redisManager
+from utils.logger import logger
+from utils.tracing import tracer
+
+# Applies one session flush in a single round trip. The version stored in the
+# meta hash guards against a concurrent writer for the same device: on a
+# mismatch nothing is written and -1 is returned, otherwise the new version.
+# Messages already archived are trimmed off the head of the list.
+FLUSH_CONTEXT_SCRIPT = """
+local version = tonumber(redis.call("HGET", KEYS[2], ARGV[1]) or "0")
+if version ~= tonumber(ARGV[2]) then
+    return -1
+end
+if ARGV[4] == "1" then
+    redis.call("DEL", KEYS[1], KEYS[2])
+elseif ARGV[5] ~= "0" then
+    redis.call("LTRIM", KEYS[1], ARGV[5], -1)
+end
+local fields = tonumber(ARGV[6])
+for index = 7, 6 + fields * 2, 2 do
+    redis.call("HSET", KEYS[2], ARGV[index], ARGV[index + 1])
+end
+for index = 7 + fields * 2, #ARGV do
+    redis.call("RPUSH", KEYS[1], ARGV[index])
+end
+version = version + 1
+redis.call("HSET", KEYS[2], ARGV[1], version)
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+return version
+"""
+
+
+flushContextScript = redisManager.get_redis().register_script(FLUSH_CONTEXT_SCRIPT)
+
+
+# The hash tag is the whole context key, so both keys and the legacy string
+# key of a device share one cluster slot.
+def get_messages_key(context_key: str) -> str:
+    return f"{{{context_key}}}:{CONTEXT_REDIS_KEYS.MESSAGES.value}"
+
+
+def get_meta_key(context_key: str) -> str:
+    return f"{{{context_key}}}:{CONTEXT_REDIS_KEYS.META.value}"
+
+
+def encode_message(message: Message) -> bytes:
+    return contextCodec.encode(message.dict())
+
+
+def decode_message(raw: bytes) -> Message:
+    return Message.parse_obj(contextCodec.decode(raw))
+
+
+def build_context_meta(context: Context) -> Dict[str, str]:
+    meta = {f"{CONTEXT_META_FIELDS.ID.value}": context.id}
+    if context.current_model is not None:
+        meta[f"{CONTEXT_META_FIELDS.CURRENT_MODEL.value}"] = context.current_model
+    if context.summary is not None:
+        meta[f"{CONTEXT_META_FIELDS.SUMMARY.value}"] = context.summary
+        meta[f"{CONTEXT_META_FIELDS.SUMMARY_COUNT.value}"] = context.summary_count
+    if context.archived_count:
+        meta[f"{CONTEXT_META_FIELDS.ARCHIVED_COUNT.value}"] = context.archived_count
+    return meta
+
+
+async def load_context(
+    context_key: str, redis: Redis = Depends(redisManager.get_redis)
+) -> Optional[Context]:
+    pipeline = redis.pipeline(transaction=False)
+    pipeline.hgetall(get_meta_key(context_key))
+    # Entries may be binary, so they skip the client's response decoding
+    # (per-command options are ignored inside MULTI).
+    pipeline.execute_command(
+        "LRANGE", get_messages_key(context_key), 0, -1, **{NEVER_DECODE: True}
+    )
+    meta, messages = await pipeline.execute()
+    if not meta:
+        return await migrate_legacy_context(context_key=context_key, redis=redis)
+    with tracer.span(SPAN_NAMES.CONTEXT_DECODE.value, messages=len(messages)):
+        return Context(
+            id=meta[CONTEXT_META_FIELDS.ID.value],
+            current_model=meta.get(CONTEXT_META_FIELDS.CURRENT_MODEL.value),
+            summary=meta.get(CONTEXT_META_FIELDS.SUMMARY.value),
+            summary_count=meta.get(CONTEXT_META_FIELDS.SUMMARY_COUNT.value, 0),
+            archived_count=meta.get(CONTEXT_META_FIELDS.ARCHIVED_COUNT.value, 0),
+            version=meta.get(CONTEXT_META_FIELDS.VERSION.value, 0),
+            messages=[decode_message(message) for message in messages],
+        )
+
+
+async def migrate_legacy_context(
+    context_key: str, redis: Redis = Depends(redisManager.get_redis)
+) -> Optional[Context]:
+    context_data = await redis.get(context_key)
+    if context_data is None:
+        return None
+    with tracer.span(SPAN_NAMES.CONTEXT_PARSE.value, bytes=len(context_data)):
+        context = Context.parse_raw(context_data)
+    await save_context(context_key=context_key, context=context, redis=redis)
+    logger.info("Migrated legacy context: %s", context_key)
+    return context
+
+
+async def save_context(
+    context_key: str,
+    context: Context,
+    redis: Redis = Depends(redisManager.get_redis),
+):
+    messages_key = get_messages_key(context_key)
+    meta_key = get_meta_key(context_key)
+    meta = build_context_meta(context)
+    meta[f"{CONTEXT_META_FIELDS.VERSION.value}"] = context.version
+
+    pipeline = redis.pipeline(transaction=True)
+    pipeline.delete(context_key, messages_key, meta_key)
+    if context.messages:
+        pipeline.rpush(
+            messages_key, *[encode_message(message) for message in context.messages]
+        )
+        pipeline.expire(messages_key, CONTEXT_EXPIRE_TIME)
+    pipeline.hset(meta_key, mapping=meta)
+    pipeline.expire(meta_key, CONTEXT_EXPIRE_TIME)
+    await pipeline.execute()
+
+
+async def flush_context(
+    context_key: str,
+    version: int,
+    messages: List[Message],
+    meta: Dict[str, str],
+    reset: bool = False,
+    trim: int = 0,
+    redis: Redis = Depends(redisManager.get_redis),
+) -> int:
+    args = [
+        CONTEXT_META_FIELDS.VERSION.value,
+        version,
+        CONTEXT_EXPIRE_TIME,
+        int(reset),
+        trim,
+        len(meta),
+    ]
+    for field, value in meta.items():
+        args.extend([field, value])
+    args.extend(encode_message(message) for message in messages)
+    return await flushContextScript(
+        keys=[get_messages_key(context_key), get_meta_key(context_key)],
+        args=args,
+        client=redis,
+    )
@@ -0,0 +1,96 @@
+from typing import List, Optional, Tuple
+from constants.ai import (
+    CONTEXT_SUMMARY_LINE_LENGTH,
+    CONTEXT_SUMMARY_TOKEN_BUDGET,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_TOKEN_BUDGET_MODELS,
+    MESSAGE_TOKEN_OVERHEAD,
+)
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
+from models.message import Message
+from services.messages import (
+    MessageCache,
+    get_message_content,
+    get_message_role,
+    messageCache,
+)
+
+summary_role_mapper = {
+    MESSAGE_ROLES.USER.value: SYSTEM_ROLES.USER.value,
+    MESSAGE_ROLES.AI.value: SYSTEM_ROLES.AI.value,
+}
+
+
+def estimate_tokens(text: str) -> int:
+    # BPE tokenizers average roughly four UTF-8 bytes per token, which also
+    # accounts for the extra bytes of accented and non-Latin scripts.
+    return (len(text.encode("utf-8")) + 3) // 4 + MESSAGE_TOKEN_OVERHEAD
+
+
+def estimate_message_tokens(
+    message: Message, cache: Optional[MessageCache] = messageCache
+) -> int:
+    if cache is None:
+        return estimate_tokens(message.prompt)
+    return cache.estimate_tokens(message=message, estimate=estimate_tokens)
+
+
+def get_token_budget(model: str) -> int:
+    return CONTEXT_TOKEN_BUDGET_MODELS.get(model, CONTEXT_TOKEN_BUDGET)
+
+
+def fit_context_window(
+    messages: List[Message],
+    budget: int,
+    cache: Optional[MessageCache] = messageCache,
+) -> int:
+    start = len(messages)
+    used = 0
+    for index in range(len(messages) - 1, -1, -1):
+        used += estimate_message_tokens(messages[index], cache=cache)
+        if used > budget and index < len(messages) - 1:
+            break
+        start = index
+    return start
+
+
+def summarize_message(message: Message) -> Optional[str]:
+    role = summary_role_mapper.get(get_message_role(message))
+    if role is None:
+        return None
+    text = " ".join(get_message_content(message).split())
+    sentence = text.split(". ")[0]
+    if len(sentence) > CONTEXT_SUMMARY_LINE_LENGTH:
+        sentence = f"{sentence[:CONTEXT_SUMMARY_LINE_LENGTH].rstrip()}..."
+    return f"{role}: {sentence}"
+
+
+def summarize_messages(summary: Optional[str], messages: List[Message]) -> str:
+    lines = summary.splitlines() if summary else []
+    for message in messages:
+        line = summarize_message(message)
+        if line is not None:
+            lines.append(line)
+
+    tokens = sum(estimate_tokens(line) for line in lines)
+    while lines and tokens > CONTEXT_SUMMARY_TOKEN_BUDGET:
+        tokens -= estimate_tokens(lines.pop(0))
+    return "\n".join(lines)
+
+
+def build_context_window(
+    model: str,
+    messages: List[Message],
+    summary: Optional[str],
+    reserved_tokens: int = 0,
+    cache: Optional[MessageCache] = messageCache,
+) -> Tuple[List[Message], Optional[str], int]:
+    budget = get_token_budget(model) - reserved_tokens - CONTEXT_SUMMARY_TOKEN_BUDGET
+    start = fit_context_window(messages=messages, budget=max(budget, 0), cache=cache)
+    if start == 0:
+        return messages, summary, 0
+    return (
+        messages[start:],
+        summarize_messages(summary=summary, messages=messages[:start]),
+        start,
+    )
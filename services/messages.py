@@ -0,0 +1,126 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+from constants.ai import (
+    AI_MODELS,
+    CONTEXT_SUMMARY_CONTENT,
+    GEMINI_CONTEXT_MESSAGE_KEYS,
+    GEMINI_ROLES,
+    GPT_CONTEXT_MESSAGE_KEYS,
+    GPT_ROLES,
+    MESSAGE_CACHE_SIZE,
+)
+from constants.base import MESSAGE_ROLES, SYSTEM_ROLES
+from models.message import Message
+
+prefix_role_mapper = {
+    f"{SYSTEM_ROLES.USER.value}:": MESSAGE_ROLES.USER.value,
+    f"{SYSTEM_ROLES.AI.value}:": MESSAGE_ROLES.AI.value,
+}
+gpt_role_mapper = {
+    MESSAGE_ROLES.USER.value: GPT_ROLES.USER.value,
+    MESSAGE_ROLES.AI.value: GPT_ROLES.ASSISTANT.value,
+}
+gemini_role_mapper = {
+    MESSAGE_ROLES.USER.value: GEMINI_ROLES.USER.value,
+    MESSAGE_ROLES.AI.value: GEMINI_ROLES.MODEL.value,
+}
+
+
+def get_message_role(message: Message) -> str:
+    if message.role is not None:
+        return message.role
+    for prefix, role in prefix_role_mapper.items():
+        if message.prompt.startswith(prefix):
+            return role
+    return MESSAGE_ROLES.SYSTEM.value
+
+
+def get_message_content(message: Message) -> str:
+    for prefix in prefix_role_mapper:
+        if message.prompt.startswith(prefix):
+            return message.prompt[len(prefix) :].lstrip(" ")
+    return message.prompt
+
+
+# Turns with no text are left out: providers reject empty content, Gemini
+# with an error for the whole request.
+def to_gpt_message(message: Message) -> Optional[dict]:
+    role = gpt_role_mapper.get(get_message_role(message))
+    content = get_message_content(message)
+    if role is None or not content:
+        return None
+    return {
+        f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": role,
+        f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": content,
+    }
+
+
+def to_gemini_message(message: Message) -> Optional[dict]:
+    role = gemini_role_mapper.get(get_message_role(message))
+    content = get_message_content(message)
+    if role is None or not content:
+        return None
+    return {
+        f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": role,
+        f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [content],
+    }
+
+
+serializer_mapper = {
+    AI_MODELS.CHATGPT.value: to_gpt_message,
+    AI_MODELS.GEMINI.value: to_gemini_message,
+}
+
+
+def serialize_summary(model: str, summary: str) -> dict:
+    content = f"{CONTEXT_SUMMARY_CONTENT}\n{summary}"
+    if model == AI_MODELS.CHATGPT.value:
+        return {
+            f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}": GPT_ROLES.SYSTEM.value,
+            f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}": content,
+        }
+    return {
+        f"{GEMINI_CONTEXT_MESSAGE_KEYS.ROLE.value}": GEMINI_ROLES.USER.value,
+        f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}": [content],
+    }
+
+
+class MessageCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.payloads: OrderedDict[str, Dict[str, Optional[dict]]] = OrderedDict()
+        self.tokens: OrderedDict[str, int] = OrderedDict()
+
+    def remember(self, entries: OrderedDict, key: str, value):
+        entries[key] = value
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return value
+
+    def serialize(self, model: str, message: Message) -> Optional[dict]:
+        payloads = self.payloads.get(message.id)
+        if payloads is None:
+            payloads = self.remember(self.payloads, message.id, {})
+        else:
+            self.payloads.move_to_end(message.id)
+        if model not in payloads:
+            payloads[model] = serializer_mapper[model](message)
+        return payloads[model]
+
+    def estimate_tokens(self, message: Message, estimate: Callable[[str], int]) -> int:
+        tokens = self.tokens.get(message.id)
+        if tokens is None:
+            return self.remember(self.tokens, message.id, estimate(message.prompt))
+        self.tokens.move_to_end(message.id)
+        return tokens
+
+
+messageCache = MessageCache(max_size=MESSAGE_CACHE_SIZE)
+
+
+def serialize_message(
+    model: str, message: Message, cache: Optional[MessageCache] = messageCache
+) -> Optional[dict]:
+    if cache is None:
+        return serializer_mapper[model](message)
+    return cache.serialize(model=model, message=message)
@@ -0,0 +1,366 @@
+import asyncio
+import sqlite3
+import sys
+from typing import Dict, List, Optional
+import uuid
+from constants.archive import CONTEXT_ARCHIVE_BATCH, CONTEXT_HOT_MESSAGES
+from constants.tracing import SPAN_NAMES
+from constants.redis import (
+    CONTEXT_FLUSH_DELAY,
+    CONTEXT_FLUSH_RETRIES,
+    CONTEXT_INVALIDATE_CHANNEL,
+    CONTEXT_INVALIDATE_RETRY_DELAY,
+    CONTEXT_MAX_UNFLUSHED_MESSAGES,
+    CONTEXT_META_FIELDS,
+)
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from models.context import Context
+from models.message import Message
+from services.archive import contextArchive
+from services.context import (
+    build_context_meta,
+    flush_context,
+    load_context,
+    save_context,
+)
+from services.context_window import summarize_messages
+from utils.logger import logger
+from utils.metrics import metricsRegistry
+from utils.tracing import tracer
+
+
+def get_message_size(message: Message) -> int:
+    # Close enough for sizing pods: the model, its field dict and the strings.
+    return (
+        sys.getsizeof(message)
+        + sys.getsizeof(message.__dict__)
+        + sum(sys.getsizeof(value) for value in message.__dict__.values())
+    )
+
+
+class ContextSession:
+    # Holds one device's context for the lifetime of its connection. Actions
+    # mutate it in memory; pending changes are written behind on a short timer,
+    # or right away once too many messages are waiting. With the archive on,
+    # every flushed message is also archived, and Redis keeps only the last
+    # CONTEXT_HOT_MESSAGES of them.
+    def __init__(self, context_key: str, redis: Redis):
+        self.context_key = context_key
+        self.redis = redis
+        self.context: Optional[Context] = None
+        self.pending_messages: List[Message] = []
+        self.pending_meta: Dict[str, str] = {}
+        self.reset = False
+        self.pending_trim = 0
+        # Messages before this position in the full history are archived.
+        self.archive_position = 0
+        self.stale = False
+        self.lock = asyncio.Lock()
+        self.flush_task: Optional[asyncio.Task] = None
+
+    async def load(self) -> Optional[Context]:
+        self.context = await load_context(
+            context_key=self.context_key, redis=self.redis
+        )
+        self.stale = False
+        if contextArchive.enabled:
+            await self.load_archive()
+        return self.context
+
+    async def load_archive(self):
+        try:
+            if self.context is None:
+                # Expired from Redis: bring the last turns back from the
+                # archive, leaving the rest to be paged in on demand.
+                self.context = await contextArchive.load(
+                    context_key=self.context_key, limit=CONTEXT_HOT_MESSAGES
+                )
+                if self.context is not None:
+                    await save_context(
+                        context_key=self.context_key,
+                        context=self.context,
+                        redis=self.redis,
+                    )
+            if self.context is not None:
+                self.archive_position = await contextArchive.get_archived_count(
+                    context_key=self.context_key, context_id=self.context.id
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Context archive read failed: {e}")
+
+    async def refresh(self):
+        if self.stale:
+            await self.flush()
+            await self.load()
+
+    def append(self, *messages: Message):
+        self.context.messages.extend(messages)
+        self.pending_messages.extend(messages)
+
+    def set_current_model(self, model: str):
+        self.context.current_model = model
+        self.pending_meta[f"{CONTEXT_META_FIELDS.CURRENT_MODEL.value}"] = model
+
+    def set_summary(self, summary: str, summary_count: int):
+        self.context.summary = summary
+        self.context.summary_count = summary_count
+        self.pending_meta[f"{CONTEXT_META_FIELDS.SUMMARY.value}"] = summary
+        self.pending_meta[f"{CONTEXT_META_FIELDS.SUMMARY_COUNT.value}"] = summary_count
+
+    def replace(self, context: Context):
+        context.version = self.context.version if self.context else 0
+        self.context = context
+        self.pending_messages = list(context.messages)
+        self.pending_meta = build_context_meta(context)
+        self.reset = True
+        self.pending_trim = 0
+        self.archive_position = 0
+
+    async def save(self):
+        if (
+            not CONTEXT_FLUSH_DELAY
+            or len(self.pending_messages) >= CONTEXT_MAX_UNFLUSHED_MESSAGES
+        ):
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(CONTEXT_FLUSH_DELAY)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except RedisError as e:
+            logger.warning(f"Deferred context flush failed: {e}")
+
+    async def flush(self):
+        with tracer.span(SPAN_NAMES.SESSION_FLUSH.value):
+            await self.flush_pending()
+
+    async def flush_pending(self):
+        async with self.lock:
+            for _ in range(CONTEXT_FLUSH_RETRIES):
+                if not (self.pending_messages or self.pending_meta or self.reset):
+                    return
+
+                # Handlers keep appending while the write is in flight, so the
+                # batch is taken out and put back if it does not land.
+                messages, meta, reset, trim = (
+                    self.pending_messages,
+                    self.pending_meta,
+                    self.reset,
+                    self.pending_trim,
+                )
+                self.pending_messages, self.pending_meta = [], {}
+                self.reset, self.pending_trim = False, 0
+                try:
+                    version = await flush_context(
+                        context_key=self.context_key,
+                        version=self.context.version,
+                        messages=messages,
+                        meta=meta,
+                        reset=reset,
+                        trim=trim,
+                        redis=self.redis,
+                    )
+                except BaseException:
+                    self.restore(messages, meta, reset, trim)
+                    raise
+                if version >= 0:
+                    self.context.version = version
+                    if contextArchive.enabled:
+                        await self.archive()
+                    return
+
+                self.restore(messages, meta, reset, trim)
+                logger.info("Context version conflict: %s", self.context_key)
+                await self.merge()
+
+            logger.warning("Context flush kept conflicting: %s", self.context_key)
+
+    def restore(
+        self, messages: List[Message], meta: Dict[str, str], reset: bool, trim: int
+    ):
+        if self.reset:
+            # A newer replace() already covers everything in the old batch.
+            return
+        self.pending_messages = messages + self.pending_messages
+        self.pending_meta = {**meta, **self.pending_meta}
+        self.reset = reset
+        self.pending_trim += trim
+
+    async def archive(self):
+        if self.reset:
+            # The context was replaced while flushing; its next flush archives.
+            return
+        context = self.context
+        # Only what has reached Redis; handlers may have appended since.
+        flushed = len(context.messages) - len(self.pending_messages)
+        start = max(self.archive_position - context.archived_count, 0)
+        try:
+            with tracer.span(SPAN_NAMES.ARCHIVE.value, messages=flushed - start):
+                await contextArchive.save(
+                    context_key=self.context_key,
+                    context=context,
+                    messages=context.messages[start:flushed],
+                    start=context.archived_count + start,
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Context archive write failed: {e}")
+            return
+        self.archive_position = max(
+            self.archive_position, context.archived_count + flushed
+        )
+        self.trim()
+
+    def trim(self):
+        # Drops archived messages beyond the hot turns from memory; the next
+        # flush drops them from Redis. Messages the summary does not cover yet
+        # are folded into it first, so the model keeps seeing them.
+        context = self.context
+        count = min(
+            len(context.messages) - CONTEXT_HOT_MESSAGES,
+            self.archive_position - context.archived_count,
+        )
+        if count < CONTEXT_ARCHIVE_BATCH:
+            return
+        archived_count = context.archived_count + count
+        if context.summary_count < archived_count:
+            self.set_summary(
+                summary=summarize_messages(
+                    summary=context.summary,
+                    messages=context.messages[
+                        max(context.summary_count - context.archived_count, 0) : count
+                    ],
+                ),
+                summary_count=archived_count,
+            )
+        del context.messages[:count]
+        context.archived_count = archived_count
+        self.pending_meta[f"{CONTEXT_META_FIELDS.ARCHIVED_COUNT.value}"] = (
+            archived_count
+        )
+        self.pending_trim += count
+
+    async def merge(self):
+        latest = await load_context(context_key=self.context_key, redis=self.redis)
+        if latest is None or self.reset:
+            # Nothing to merge with, or this session starts over anyway.
+            self.context.version = latest.version if latest else 0
+            self.replace(self.context)
+            return
+
+        # Another writer moved the list, so the pending summary offset may no
+        # longer line up; it is rebuilt on the next turn instead.
+        self.pending_meta.pop(f"{CONTEXT_META_FIELDS.SUMMARY.value}", None)
+        self.pending_meta.pop(f"{CONTEXT_META_FIELDS.SUMMARY_COUNT.value}", None)
+        # The same goes for a pending trim; the next archive pass redoes it.
+        self.pending_meta.pop(f"{CONTEXT_META_FIELDS.ARCHIVED_COUNT.value}", None)
+        self.pending_trim = 0
+        latest.messages.extend(self.pending_messages)
+        model = self.pending_meta.get(f"{CONTEXT_META_FIELDS.CURRENT_MODEL.value}")
+        if model is not None:
+            latest.current_model = model
+        self.context = latest
+
+    async def invalidate(self):
+        # Another connection for this device may write next: push out what is
+        # pending and reload before this session serves another action.
+        self.stale = True
+        try:
+            await self.flush()
+        except RedisError as e:
+            logger.warning(f"Context flush on invalidation failed: {e}")
+
+    def snapshot(self) -> dict:
+        messages = self.context.messages if self.context else []
+        return {
+            "messages": len(messages),
+            "pending_messages": len(self.pending_messages),
+            "context_bytes": sum(get_message_size(message) for message in messages)
+            + sys.getsizeof(self.context.summary if self.context else None),
+        }
+
+    async def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        try:
+            await self.flush()
+        except RedisError as e:
+            logger.warning(f"Dropping unsaved context changes: {e}")
+
+
+class ContextSessionManager:
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.sessions: Dict[str, ContextSession] = {}
+
+    async def open(self, session: ContextSession):
+        previous = self.sessions.get(session.context_key)
+        self.sessions[session.context_key] = session
+        if previous is not None:
+            await previous.invalidate()
+        try:
+            await session.redis.publish(
+                CONTEXT_INVALIDATE_CHANNEL, f"{self.worker_id}:{session.context_key}"
+            )
+        except RedisError as e:
+            logger.warning(f"Context invalidation publish failed: {e}")
+
+    def close(self, session: ContextSession):
+        if self.sessions.get(session.context_key) is session:
+            del self.sessions[session.context_key]
+
+    async def invalidate(self, context_key: str):
+        session = self.sessions.get(context_key)
+        if session is not None:
+            await session.invalidate()
+
+    def snapshot(self) -> dict:
+        sessions = [session.snapshot() for session in self.sessions.values()]
+        context_bytes = [item["context_bytes"] for item in sessions]
+        return {
+            "sessions": len(sessions),
+            "messages": sum(item["messages"] for item in sessions),
+            "pending_messages": sum(item["pending_messages"] for item in sessions),
+            "context_bytes": sum(context_bytes),
+            "avg_context_bytes": (
+                sum(context_bytes) // len(sessions) if sessions else 0
+            ),
+            "max_context_bytes": max(context_bytes, default=0),
+        }
+
+    async def listen(self, redis: Redis):
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CONTEXT_INVALIDATE_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        worker_id, context_key = message["data"].split(":", 1)
+                        if worker_id != self.worker_id:
+                            await self.invalidate(context_key)
+            except RedisError as e:
+                logger.warning(f"Context invalidation listener failed: {e}")
+                await asyncio.sleep(CONTEXT_INVALIDATE_RETRY_DELAY)
+
+
+contextSessionManager = ContextSessionManager()
+
+metricsRegistry.gauge(
+    "ai_context_sessions",
+    "Context sessions held in memory on this worker.",
+    callback=lambda: len(contextSessionManager.sessions),
+)
+metricsRegistry.gauge(
+    "ai_context_session_messages",
+    "Messages held in memory across context sessions on this worker.",
+    callback=lambda: sum(
+        len(session.context.messages)
+        for session in contextSessionManager.sessions.values()
+        if session.context is not None
+    ),
+)
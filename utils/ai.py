@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional
+from constants.ai import (
+    AI_API_KEYS,
+    AI_MODELS,
+    AI_QUERY_MODELS,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    PROVIDER_RETRYABLE_STATUS_CODES,
+)
+from utils.logger import logger
+
+
+class ProviderPlugin(NamedTuple):
+    load: Callable[[], Any]
+    close: Optional[Callable[[Any], Awaitable[None]]] = None
+
+
+class AIClientManager:
+    # Provider SDKs are heavy to import, so each one is only loaded the first
+    # time its model is used, or at startup when warmup is on.
+    def __init__(self):
+        self.plugins: Dict[str, ProviderPlugin] = {}
+        self.clients: Dict[str, Any] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def register(self, model: str, plugin: ProviderPlugin):
+        self.plugins[model] = plugin
+        self.locks[model] = asyncio.Lock()
+
+    async def get(self, model: str) -> Any:
+        client = self.clients.get(model)
+        if client is not None:
+            return client
+        async with self.locks[model]:
+            if model not in self.clients:
+                # Imports run in a thread so a cold provider does not stall
+                # every other socket on this worker.
+                started = time.perf_counter()
+                self.clients[model] = await asyncio.to_thread(self.plugins[model].load)
+                logger.info(
+                    "Loaded %s client in %.0fms",
+                    model,
+                    (time.perf_counter() - started) * 1000,
+                )
+        return self.clients[model]
+
+    async def get_openai(self):
+        return await self.get(AI_MODELS.CHATGPT.value)
+
+    async def get_gemini(self):
+        return await self.get(AI_MODELS.GEMINI.value)
+
+    async def warmup(self, models: Optional[Iterable[str]] = None):
+        for model in models or list(self.plugins):
+            await self.get(model)
+
+    async def close(self):
+        for model, client in self.clients.items():
+            plugin = self.plugins.get(model)
+            if plugin is not None and plugin.close is not None:
+                await plugin.close(client)
+        self.clients.clear()
+        logger.info("AI clients closed")
+
+
+def load_openai():
+    import httpx
+    import openai
+
+    return openai.AsyncOpenAI(
+        api_key=AI_API_KEYS.OPENAI.value,
+        http_client=openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            )
+        ),
+    )
+
+
+async def close_openai(client):
+    await client.close()
+
+
+def load_gemini():
+    import google.generativeai as genai
+
+    genai.configure(api_key=AI_API_KEYS.GEMINI.value)
+    return genai.GenerativeModel(model_name=AI_QUERY_MODELS.GEMINI.value)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # Only look at SDK error types once the SDK has been loaded.
+    openai = sys.modules.get("openai")
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    return get_error_status(error) in PROVIDER_RETRYABLE_STATUS_CODES
+
+
+def get_error_status(error: BaseException) -> Optional[int]:
+    # OpenAI errors carry status_code, google.api_core errors carry code.
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    # Bad requests, auth errors and content-policy rejections fail the same
+    # way on every attempt and say nothing about the provider's health.
+    if is_retryable_error(error):
+        return True
+    status = get_error_status(error)
+    return status is not None and status >= 500
+
+
+aiClientManager = AIClientManager()
+aiClientManager.register(
+    AI_MODELS.CHATGPT.value, ProviderPlugin(load=load_openai, close=close_openai)
+)
+aiClientManager.register(AI_MODELS.GEMINI.value, ProviderPlugin(load=load_gemini))
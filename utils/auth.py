@@ -0,0 +1,22 @@
+import hmac
+from typing import Awaitable, Callable, Optional
+from fastapi import Header, HTTPException
+from constants.base import AUTH_SCHEME
+
+
+def require_token(token: str) -> Callable[..., Awaitable[None]]:
+    # Dependency for endpoints that are not meant for clients. Without a
+    # configured token the endpoint is switched off and answers 404.
+    expected = f"{AUTH_SCHEME} {token}".encode()
+
+    async def check(authorization: Optional[str] = Header(None)):
+        if not token:
+            raise HTTPException(status_code=404)
+        if authorization is None or not hmac.compare_digest(
+            authorization.encode(), expected
+        ):
+            raise HTTPException(
+                status_code=401, headers={"WWW-Authenticate": AUTH_SCHEME}
+            )
+
+    return check
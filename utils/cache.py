@@ -0,0 +1,171 @@
+from collections import OrderedDict
+import hashlib
+import json
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from constants.ai import GEMINI_CONTEXT_MESSAGE_KEYS, GPT_CONTEXT_MESSAGE_KEYS
+from constants.redis import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_INDEX_KEY,
+    RESPONSE_CACHE_KEY,
+    RESPONSE_CACHE_LOCAL_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_WINDOW,
+)
+from utils.logger import logger
+from utils.metrics import metricsRegistry
+
+KeyBuilder = Callable[[str, List[dict]], Optional[str]]
+
+# Stores one response and trims the index of expired and overflowing keys in
+# the same round trip, oldest first.
+SET_RESPONSE_SCRIPT = """
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[2])
+redis.call("SET", KEYS[2], ARGV[1], "EX", ttl)
+redis.call("ZADD", KEYS[1], now, KEYS[2])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - ttl * 1000)
+local overflow = redis.call("ZCARD", KEYS[1]) - tonumber(ARGV[4])
+if overflow > 0 then
+    local evicted = redis.call("ZPOPMIN", KEYS[1], overflow)
+    for index = 1, #evicted, 2 do
+        redis.call("DEL", evicted[index])
+    end
+end
+return 1
+"""
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.casefold().split()).strip(" .!?")
+
+
+def get_payload_content(payload: dict) -> str:
+    content = payload.get(f"{GPT_CONTEXT_MESSAGE_KEYS.CONTENT.value}")
+    if content is None:
+        content = " ".join(
+            payload.get(f"{GEMINI_CONTEXT_MESSAGE_KEYS.PARTS.value}", [])
+        )
+    return content
+
+
+def build_exact_key(model: str, context_messages: List[dict]) -> Optional[str]:
+    window = [
+        [
+            payload.get(f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}"),
+            normalize_text(get_payload_content(payload)),
+        ]
+        for payload in context_messages[-RESPONSE_CACHE_WINDOW:]
+    ]
+    return hashlib.sha256(
+        json.dumps([model, window], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, key_builder: KeyBuilder = build_exact_key):
+        self.enabled = RESPONSE_CACHE_ENABLED
+        self.key_builder = key_builder
+        self.local: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self.script = None
+        self.hits = 0
+        self.local_hits = 0
+        self.misses = 0
+
+    def set_key_builder(self, key_builder: KeyBuilder):
+        self.key_builder = key_builder
+        self.local.clear()
+
+    def get_local(self, key: str) -> Optional[str]:
+        entry = self.local.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del self.local[key]
+            return None
+        self.local.move_to_end(key)
+        return response
+
+    def set_local(self, key: str, response: str):
+        self.local[key] = (time.monotonic() + RESPONSE_CACHE_TTL, response)
+        self.local.move_to_end(key)
+        while len(self.local) > RESPONSE_CACHE_LOCAL_MAX_ENTRIES:
+            self.local.popitem(last=False)
+
+    async def get(
+        self, model: str, context_messages: List[dict], redis: Redis
+    ) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = self.key_builder(model, context_messages)
+        if key is None:
+            return None
+
+        response = self.get_local(key)
+        if response is not None:
+            self.hits += 1
+            self.local_hits += 1
+            return response
+
+        try:
+            response = await redis.get(f"{RESPONSE_CACHE_KEY}:{key}")
+        except RedisError as e:
+            logger.warning(f"Response cache read failed: {e}")
+        if response is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.set_local(key, response)
+        return response
+
+    async def set(
+        self, model: str, context_messages: List[dict], response: str, redis: Redis
+    ):
+        if not self.enabled or not response:
+            return
+        key = self.key_builder(model, context_messages)
+        if key is None:
+            return
+
+        self.set_local(key, response)
+        if self.script is None:
+            self.script = redis.register_script(SET_RESPONSE_SCRIPT)
+        try:
+            await self.script(
+                keys=[RESPONSE_CACHE_INDEX_KEY, f"{RESPONSE_CACHE_KEY}:{key}"],
+                args=[
+                    response,
+                    RESPONSE_CACHE_TTL,
+                    int(time.time() * 1000),
+                    RESPONSE_CACHE_MAX_ENTRIES,
+                ],
+                client=redis,
+            )
+        except RedisError as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "local_entries": len(self.local),
+        }
+
+
+responseCache = ResponseCache()
+
+metricsRegistry.counter(
+    "ai_response_cache_hits_total",
+    "Provider replies served from the response cache.",
+    callback=lambda: responseCache.hits,
+)
+metricsRegistry.counter(
+    "ai_response_cache_misses_total",
+    "Response cache lookups that went to the provider.",
+    callback=lambda: responseCache.misses,
+)
@@ -0,0 +1,127 @@
+import json
+from typing import Callable, Dict, NamedTuple
+import zlib
+from constants.codec import (
+    CODEC_IDS,
+    CODECS,
+    COMPRESSION_IDS,
+    COMPRESSIONS,
+    CONTEXT_CODEC,
+    CONTEXT_COMPRESSION,
+    CONTEXT_COMPRESSION_THRESHOLD,
+    LEGACY_JSON_PREFIX,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+class Codec(NamedTuple):
+    dumps: Callable[[dict], bytes]
+    loads: Callable[[bytes], dict]
+
+
+class Compression(NamedTuple):
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def json_dumps(data: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_loads(raw: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def identity(raw: bytes) -> bytes:
+    return raw
+
+
+codecs: Dict[str, Codec] = {CODECS.JSON.value: Codec(json_dumps, json_loads)}
+if msgpack is not None:
+    codecs[CODECS.MSGPACK.value] = Codec(
+        lambda data: msgpack.packb(data, use_bin_type=True),
+        lambda raw: msgpack.unpackb(raw, raw=False),
+    )
+
+compressions: Dict[str, Compression] = {
+    COMPRESSIONS.NONE.value: Compression(identity, identity),
+    COMPRESSIONS.ZLIB.value: Compression(zlib.compress, zlib.decompress),
+}
+if zstandard is not None:
+    compressions[COMPRESSIONS.ZSTD.value] = Compression(
+        zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    )
+if lz4 is not None:
+    compressions[COMPRESSIONS.LZ4.value] = Compression(
+        lz4.frame.compress, lz4.frame.decompress
+    )
+
+codec_names = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+compression_names = {
+    compression_id: name for name, compression_id in COMPRESSION_IDS.items()
+}
+
+
+class ContextCodec:
+    def __init__(self, codec: str, compression: str, threshold: int):
+        if codec not in codecs:
+            raise ValueError(f"Context codec is not available: {codec}")
+        if compression not in compressions:
+            raise ValueError(f"Context compression is not available: {compression}")
+        self.codec = codec
+        self.compression = compression
+        self.threshold = threshold
+
+    def encode(self, data: dict) -> bytes:
+        payload = codecs[self.codec].dumps(data)
+        compression = (
+            self.compression
+            if len(payload) >= self.threshold
+            else COMPRESSIONS.NONE.value
+        )
+        # Uncompressed JSON stays bare so workers without the codec layer can
+        # still read it.
+        if self.codec == CODECS.JSON.value and compression == COMPRESSIONS.NONE.value:
+            return payload
+        header = CODEC_IDS[self.codec] * 16 + COMPRESSION_IDS[compression]
+        return bytes([header]) + compressions[compression].compress(payload)
+
+    def decode(self, raw: bytes) -> dict:
+        if raw[:1] == LEGACY_JSON_PREFIX:
+            return json_loads(raw)
+        codec_id, compression_id = divmod(raw[0], 16)
+        codec = codecs.get(codec_names.get(codec_id))
+        compression = compressions.get(compression_names.get(compression_id))
+        if codec is None or compression is None:
+            raise ValueError(f"Unsupported context entry format: {raw[0]:#04x}")
+        return codec.loads(compression.decompress(raw[1:]))
+
+
+contextCodec = ContextCodec(
+    codec=CONTEXT_CODEC,
+    compression=CONTEXT_COMPRESSION,
+    threshold=CONTEXT_COMPRESSION_THRESHOLD,
+)
@@ -1,10 +1,71 @@
 import gettext
+import os
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping
 from constants.i18n import DOMAIN, LOCALEDIR
+from utils.logger import logger
+
+Translator = Callable[[str], str]
+
+
+def identity(key: str) -> str:
+    return key
+
+
+class TranslationRegistry:
+    def __init__(self, domain: str, localedir: str):
+        self.domain = domain
+        self.localedir = localedir
+        self.catalogs: Mapping[str, Mapping[str, str]] = MappingProxyType({})
+        self.translators: Dict[str, Translator] = {}
+        self.loaded = False
+
+    def load(self):
+        catalogs = {}
+        for locale in sorted(os.listdir(self.localedir)):
+            path = gettext.find(self.domain, self.localedir, languages=[locale])
+            if path is None:
+                continue
+            with open(path, "rb") as mo_file:
+                translations = gettext.GNUTranslations(mo_file)
+            catalogs[locale] = MappingProxyType(
+                {
+                    key: value
+                    for key, value in translations._catalog.items()
+                    if isinstance(key, str) and key
+                }
+            )
+
+        self.catalogs = MappingProxyType(catalogs)
+        self.translators = {
+            locale: self.bind(catalog) for locale, catalog in catalogs.items()
+        }
+        self.loaded = True
+        logger.info("Loaded translations: %s", ", ".join(catalogs))
+
+    @staticmethod
+    def bind(catalog: Mapping[str, str]) -> Translator:
+        def translate(key: str) -> str:
+            return catalog.get(key, key)
+
+        return translate
+
+    def translator(self, locale: str) -> Translator:
+        if not self.loaded:
+            self.load()
+        translator = self.translators.get(locale)
+        if translator is not None:
+            return translator
+        language = locale.split(".")[0].split("@")[0]
+        for candidate in (language, language.replace("-", "_").split("_")[0]):
+            translator = self.translators.get(candidate)
+            if translator is not None:
+                return translator
+        return identity
+
+
+translationRegistry = TranslationRegistry(domain=DOMAIN, localedir=LOCALEDIR)
+
 
 def t(locale: str, key: str) -> str:
-    i18n = gettext.translation(
-        domain=DOMAIN, localedir=LOCALEDIR, fallback=True, languages=[locale]
-    )
-    i18n.install()
-    _ = i18n.gettext
-    return _(key)
+    return translationRegistry.translator(locale)(key)
@@ -0,0 +1,299 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from constants.metrics import LATENCY_BUCKETS, METRICS_ENABLED, ROUND_TRIP_BUCKETS
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        callback: Optional[Callable[[], float]] = None,
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        if self.callback is not None:
+            return [f"{self.name} {format_value(self.callback())}"]
+        return [
+            f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str):
+        if not self.registry.enabled:
+            return
+        self.values[self.key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * len(self.buckets)
+            self.sums[key] = 0
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        if not self.registry.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        samples = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(
+                    self.label_names, key, f'le="{format_value(bucket)}"'
+                )
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, key)
+            samples.append(f"{self.name}_sum{labels} {format_value(self.sums[key])}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, **kwargs) -> Counter:
+        return self.register(Counter(self, name, documentation, **kwargs))
+
+    def gauge(self, name: str, documentation: str, **kwargs) -> Gauge:
+        return self.register(Gauge(self, name, documentation, **kwargs))
+
+    def histogram(self, name: str, documentation: str, **kwargs) -> Histogram:
+        return self.register(Histogram(self, name, documentation, **kwargs))
+
+    def render(self) -> str:
+        if not self.enabled:
+            return ""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metricsRegistry = MetricsRegistry(enabled=METRICS_ENABLED)
+
+message_stage_seconds = metricsRegistry.histogram(
+    "ai_message_stage_seconds",
+    "Time spent in each stage of handling a send_message action.",
+    label_names=("stage",),
+)
+provider_request_seconds = metricsRegistry.histogram(
+    "ai_provider_request_seconds",
+    "Provider request latency by model.",
+    label_names=("model",),
+)
+provider_errors_total = metricsRegistry.counter(
+    "ai_provider_errors_total",
+    "Failed provider requests by model.",
+    label_names=("model",),
+)
+provider_retries_total = metricsRegistry.counter(
+    "ai_provider_retries_total",
+    "Provider attempts retried after a retryable error, by model.",
+    label_names=("model",),
+)
+provider_fallbacks_total = metricsRegistry.counter(
+    "ai_provider_fallbacks_total",
+    "Requests answered by a fallback model, by requested model.",
+    label_names=("model",),
+)
+provider_rejections_total = metricsRegistry.counter(
+    "ai_provider_rejections_total",
+    "Provider attempts rejected before reaching the provider.",
+    label_names=("model", "reason"),
+)
+provider_circuit_state = metricsRegistry.gauge(
+    "ai_provider_circuit_state",
+    "Circuit breaker state by model and pool: 0 closed, 1 half open, 2 open.",
+    label_names=("model", "pool"),
+)
+provider_in_flight = metricsRegistry.gauge(
+    "ai_provider_in_flight",
+    "Provider calls in flight by model and pool.",
+    label_names=("model", "pool"),
+)
+provider_queue_depth = metricsRegistry.gauge(
+    "ai_provider_queue_depth",
+    "Provider calls waiting for a concurrency slot by model and pool.",
+    label_names=("model", "pool"),
+)
+single_flight_requests_total = metricsRegistry.counter(
+    "ai_single_flight_requests_total",
+    "Provider queries by single-flight role: leader, local or redis follower.",
+    label_names=("role",),
+)
+rate_limit_rejections_total = metricsRegistry.counter(
+    "ai_rate_limit_rejections_total",
+    "Client actions rejected by the rate limiter.",
+)
+websocket_dropped_frames_total = metricsRegistry.counter(
+    "ai_websocket_dropped_frames_total",
+    "Outbound frames dropped because a client's send queue was full.",
+)
+websocket_coalesced_frames_total = metricsRegistry.counter(
+    "ai_websocket_coalesced_frames_total",
+    "Stream frames merged into an already queued frame.",
+)
+websocket_slow_disconnects_total = metricsRegistry.counter(
+    "ai_websocket_slow_disconnects_total",
+    "Clients disconnected because their send queue was full.",
+)
+websocket_rejected_total = metricsRegistry.counter(
+    "ai_websocket_rejected_total",
+    "Connections turned away because the worker was at its connection limit.",
+)
+websocket_reaped_total = metricsRegistry.counter(
+    "ai_websocket_reaped_total",
+    "Connections closed by the idle sweep, by reason.",
+    label_names=("reason",),
+)
+redis_round_trips = metricsRegistry.histogram(
+    "ai_redis_round_trips",
+    "Redis round trips per client action.",
+    label_names=("action",),
+    buckets=ROUND_TRIP_BUCKETS,
+)
+
+traces_exported_total = metricsRegistry.counter(
+    "ai_traces_exported_total",
+    "Traces slower than the threshold written to the trace file.",
+)
+event_loop_lag_seconds = metricsRegistry.histogram(
+    "ai_event_loop_lag_seconds",
+    "How late the event loop woke the lag monitor.",
+)
+event_loop_blocked_total = metricsRegistry.counter(
+    "ai_event_loop_blocked_total",
+    "Times the event loop was blocked past the threshold.",
+)
+context_archived_messages_total = metricsRegistry.counter(
+    "ai_context_archived_messages_total",
+    "Messages written to the context archive.",
+)
+batch_records_total = metricsRegistry.counter(
+    "ai_batch_records_total",
+    "Batch records answered, by model and result.",
+    label_names=("model", "result"),
+)
+
+
+def get_resident_memory() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+redis_round_trip_counter: ContextVar[Optional[List[int]]] = ContextVar(
+    "redis_round_trip_counter", default=None
+)
+
+
+def count_redis_round_trip():
+    counter = redis_round_trip_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@contextmanager
+def track_redis_round_trips(action: str):
+    if not metricsRegistry.enabled:
+        yield
+        return
+    counter = [0]
+    token = redis_round_trip_counter.set(counter)
+    try:
+        yield
+    finally:
+        redis_round_trip_counter.reset(token)
+        redis_round_trips.observe(counter[0], action=action)
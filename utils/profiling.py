@@ -0,0 +1,135 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+from constants.tracing import (
+    LOOP_BLOCK_STACK_LIMIT,
+    LOOP_BLOCK_THRESHOLD,
+    LOOP_LAG_INTERVAL,
+    PROFILE_MIN_INTERVAL,
+)
+from utils.logger import logger
+from utils.metrics import event_loop_blocked_total, event_loop_lag_seconds
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LoopMonitor:
+    # A task on the loop ticks every `interval` and records how late it woke.
+    # A watchdog thread checks the ticks: when the loop has not ticked for
+    # longer than `threshold`, whatever runs on the loop thread at that moment
+    # is the blocking call, and its stack is logged once per stall.
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_tick = 0.0
+        self.thread_id: Optional[int] = None
+        self.stopped = threading.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if not self.interval:
+            return
+        self.thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.stopped.clear()
+        self.task = asyncio.create_task(self.tick())
+        threading.Thread(target=self.watch, name="loop-monitor", daemon=True).start()
+
+    async def tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self.last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+            event_loop_lag_seconds.observe(
+                max(loop.time() - started - self.interval, 0)
+            )
+
+    def watch(self):
+        reported = False
+        while not self.stopped.wait(self.interval):
+            stalled = time.monotonic() - self.last_tick - self.interval
+            if stalled < self.threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            event_loop_blocked_total.inc()
+            frame = sys._current_frames().get(self.thread_id)
+            stack = (
+                "".join(traceback.format_stack(frame, limit=LOOP_BLOCK_STACK_LIMIT))
+                if frame is not None
+                else ""
+            )
+            logger.warning(
+                f"Event loop blocked for over {stalled * 1000:.0f}ms in:\n{stack}"
+            )
+
+    def stop(self):
+        self.stopped.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+def get_frame_name(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if path.startswith(ROOT):
+        path = os.path.relpath(path, ROOT)
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+class SamplingProfiler:
+    # Samples the stacks of every thread but its own at a fixed interval, in a
+    # worker thread so the loop keeps serving while it is profiled. The result
+    # is in the folded format ("thread;outer;inner count" per line) that
+    # flamegraph.pl, speedscope and inferno read directly.
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def sample(self, seconds: float, interval: float) -> Dict[str, int]:
+        own = threading.get_ident()
+        stacks: Dict[str, int] = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(get_frame_name(frame))
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stack = ";".join(reversed(frames))
+                stacks[stack] = stacks.get(stack, 0) + 1
+            time.sleep(interval)
+        return stacks
+
+    def run(self, seconds: float, interval: float) -> str:
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            stacks = self.sample(seconds, max(interval, PROFILE_MIN_INTERVAL))
+        finally:
+            self.lock.release()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+    async def profile(self, seconds: float, interval: float) -> str:
+        return await asyncio.to_thread(self.run, seconds, interval)
+
+
+loopMonitor = LoopMonitor(interval=LOOP_LAG_INTERVAL, threshold=LOOP_BLOCK_THRESHOLD)
+samplingProfiler = SamplingProfiler()
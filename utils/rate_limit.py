@@ -0,0 +1,109 @@
+from collections import OrderedDict, deque
+import time
+from typing import List, Optional, Tuple
+import uuid
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from constants.base import (
+    RATE_LIMIT_COUNT,
+    RATE_LIMIT_LOCAL_MAX_KEYS,
+    RATE_LIMIT_MAX_PERIOD,
+    RATE_LIMIT_MODELS,
+    RATE_LIMIT_PERIOD,
+)
+from constants.redis import RATE_LIMIT_KEY
+from utils.logger import logger
+
+# Sliding window log over sorted sets. Every window is checked before any is
+# recorded, so a rejected request never consumes quota.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+for index, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[index * 2 + 1])
+    local period = tonumber(ARGV[index * 2 + 2])
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now - period)
+    if redis.call("ZCARD", key) >= limit then
+        return 0
+    end
+end
+for index, key in ipairs(KEYS) do
+    local period = tonumber(ARGV[index * 2 + 2])
+    redis.call("ZADD", key, now, member)
+    redis.call("PEXPIRE", key, period)
+end
+return 1
+"""
+
+
+class LocalRateLimiter:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.windows: OrderedDict[str, deque] = OrderedDict()
+
+    def is_allowed(self, limits: List[Tuple[str, int, int]], now: int) -> bool:
+        windows = []
+        for key, limit, period in limits:
+            window = self.windows.get(key)
+            if window is None or window.maxlen != limit:
+                window = deque(window or (), maxlen=limit)
+                self.windows[key] = window
+            self.windows.move_to_end(key)
+            while window and now - window[0] >= period:
+                window.popleft()
+            if len(window) >= limit:
+                return False
+            windows.append(window)
+
+        for window in windows:
+            window.append(now)
+        while len(self.windows) > self.max_keys:
+            self.windows.popitem(last=False)
+        return True
+
+    def prune(self, now: int):
+        # Windows whose newest hit is older than every period can't reject
+        # anything anymore.
+        for key, window in list(self.windows.items()):
+            if not window or now - window[-1] >= RATE_LIMIT_MAX_PERIOD * 1000:
+                del self.windows[key]
+
+
+class RateLimiter:
+    def __init__(self):
+        self.script = None
+        self.local = LocalRateLimiter(max_keys=RATE_LIMIT_LOCAL_MAX_KEYS)
+
+    def get_limits(
+        self, device_id: str, model: Optional[str]
+    ) -> List[Tuple[str, int, int]]:
+        # The hash tag keeps every key of one device in the same cluster slot.
+        device_key = f"{RATE_LIMIT_KEY}:{{{device_id}}}"
+        limits = [(device_key, RATE_LIMIT_COUNT, RATE_LIMIT_PERIOD * 1000)]
+        if model in RATE_LIMIT_MODELS:
+            count, period = RATE_LIMIT_MODELS[model]
+            limits.append((f"{device_key}:{model}", count, period * 1000))
+        return limits
+
+    async def is_allowed(
+        self, device_id: str, redis: Redis, model: Optional[str] = None
+    ) -> bool:
+        limits = self.get_limits(device_id=device_id, model=model)
+        now = int(time.time() * 1000)
+        if self.script is None:
+            self.script = redis.register_script(SLIDING_WINDOW_SCRIPT)
+
+        args = [now, uuid.uuid4().hex]
+        for _, limit, period in limits:
+            args.extend([limit, period])
+        try:
+            allowed = await self.script(
+                keys=[key for key, _, _ in limits], args=args, client=redis
+            )
+            return bool(allowed)
+        except RedisError as e:
+            logger.warning(f"Falling back to local rate limit: {e}")
+            return self.local.is_allowed(limits=limits, now=now)
+
+
+rateLimiter = RateLimiter()
@@ -1,11 +1,41 @@
 from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
 from constants.redis import REDIS_CONNECTION_PARAMETERS
+from constants.tracing import SPAN_KINDS, SPAN_NAMES
 from utils.logger import logger
+from utils.metrics import count_redis_round_trip
+from utils.tracing import tracer
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        count_redis_round_trip()
+        with tracer.span(
+            SPAN_NAMES.REDIS.value,
+            kind=SPAN_KINDS.CLIENT.value,
+            command="PIPELINE",
+            commands=len(self.command_stack),
+        ):
+            return await super().execute(raise_on_error=raise_on_error)
+
+
+class InstrumentedRedis(Redis):
+    async def execute_command(self, *args, **options):
+        count_redis_round_trip()
+        with tracer.span(
+            SPAN_NAMES.REDIS.value, kind=SPAN_KINDS.CLIENT.value, command=args[0]
+        ):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
 
 
 class RedisManager:
     def __init__(self):
-        self.redis = Redis(
+        self.redis = InstrumentedRedis(
             host=REDIS_CONNECTION_PARAMETERS.HOST.value,
             port=REDIS_CONNECTION_PARAMETERS.PORT.value,
             username=REDIS_CONNECTION_PARAMETERS.USERNAME.value,
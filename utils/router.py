@@ -0,0 +1,366 @@
+import asyncio
+import random
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from constants.ai import (
+    AI_MODELS,
+    CIRCUIT_STATES,
+    PROVIDER_BREAKER_RESET,
+    PROVIDER_BREAKER_THRESHOLD,
+    PROVIDER_DEADLINE,
+    PROVIDER_FALLBACK,
+    PROVIDER_MAX_CONCURRENCY,
+    PROVIDER_MAX_QUEUE,
+    PROVIDER_MAX_RETRIES,
+    PROVIDER_POOLS,
+    PROVIDER_RETRY_BASE_DELAY,
+    PROVIDER_RETRY_MAX_DELAY,
+    PROVIDER_TIMEOUT,
+)
+from constants.tracing import SPAN_KINDS, SPAN_NAMES
+from utils.ai import is_provider_failure, is_retryable_error
+from utils.logger import logger
+from utils.tracing import tracer
+from utils.metrics import (
+    provider_circuit_state,
+    provider_errors_total,
+    provider_fallbacks_total,
+    provider_in_flight,
+    provider_queue_depth,
+    provider_rejections_total,
+    provider_retries_total,
+)
+
+circuit_state_values = {
+    CIRCUIT_STATES.CLOSED.value: 0,
+    CIRCUIT_STATES.HALF_OPEN.value: 1,
+    CIRCUIT_STATES.OPEN.value: 2,
+}
+
+
+class ProviderRejected(Exception):
+    def __init__(self, model: str, reason: str):
+        super().__init__(f"{model} rejected the call: {reason}")
+        self.model = model
+        self.reason = reason
+
+
+class ProviderUnavailable(Exception):
+    def __init__(self, model: str):
+        super().__init__(f"No provider could answer for {model}")
+        self.model = model
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_STATES.CLOSED.value
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.state == CIRCUIT_STATES.CLOSED.value:
+            return True
+        if self.state == CIRCUIT_STATES.OPEN.value:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = CIRCUIT_STATES.HALF_OPEN.value
+        # Half open lets a single probe through at a time.
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.state = CIRCUIT_STATES.CLOSED.value
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if (
+            self.state == CIRCUIT_STATES.HALF_OPEN.value
+            or self.failures >= self.threshold
+        ):
+            self.state = CIRCUIT_STATES.OPEN.value
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        self.probing = False
+
+
+class ProviderState:
+    def __init__(self, model: str, pool: str, max_concurrency: int, max_queue: int):
+        self.model = model
+        self.pool = pool
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(
+            threshold=PROVIDER_BREAKER_THRESHOLD, reset_timeout=PROVIDER_BREAKER_RESET
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rejections = 0
+        self.fallbacks = 0
+
+    def update_metrics(self):
+        provider_circuit_state.set(
+            circuit_state_values[self.breaker.state], model=self.model, pool=self.pool
+        )
+        provider_in_flight.set(self.in_flight, model=self.model, pool=self.pool)
+        provider_queue_depth.set(self.waiting, model=self.model, pool=self.pool)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rejections": self.rejections,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class RoutedStream:
+    # Holds the provider slot until the stream ends, fails or is closed; each
+    # chunk gets its own timeout so a stalled stream cannot hang the socket.
+    def __init__(
+        self,
+        router: "ProviderRouter",
+        state: ProviderState,
+        chunks: AsyncIterator[str],
+        first: Optional[str],
+    ):
+        self.router = router
+        self.state = state
+        self.chunks = chunks
+        self.first = first
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self.first is not None:
+            chunk, self.first = self.first, None
+            return chunk
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            return await asyncio.wait_for(self.chunks.__anext__(), PROVIDER_TIMEOUT)
+        except StopAsyncIteration:
+            self.close()
+            raise
+        except BaseException as e:
+            self.close(error=e)
+            raise
+
+    def close(self, error: Optional[BaseException] = None):
+        if not self.closed:
+            self.closed = True
+            self.router.release(self.state, error=error)
+
+    async def aclose(self):
+        # Abandoned by the consumer: free the slot without judging the provider.
+        self.close(error=asyncio.CancelledError())
+        aclose = getattr(self.chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+class ProviderRouter:
+    # Each router holds its own slots, queue and breakers per model, so a pool
+    # of background work cannot take the slots interactive calls wait for.
+    def __init__(
+        self,
+        models: List[str],
+        pool: str = PROVIDER_POOLS.INTERACTIVE.value,
+        max_concurrency: int = PROVIDER_MAX_CONCURRENCY,
+        max_queue: int = PROVIDER_MAX_QUEUE,
+    ):
+        self.states: Dict[str, ProviderState] = {
+            model: ProviderState(
+                model,
+                pool=pool,
+                max_concurrency=max(max_concurrency, 1),
+                max_queue=max_queue,
+            )
+            for model in models
+        }
+
+    def get_candidates(self, model: str) -> List[str]:
+        if not PROVIDER_FALLBACK:
+            return [model]
+        return [model] + [candidate for candidate in self.states if candidate != model]
+
+    async def query(
+        self, model: str, request: Callable[[str], Awaitable[str]]
+    ) -> Tuple[str, str]:
+        async def attempt(state: ProviderState, deadline: float) -> str:
+            with tracer.span(
+                SPAN_NAMES.PROVIDER_CALL.value,
+                kind=SPAN_KINDS.CLIENT.value,
+                model=state.model,
+            ):
+                await self.acquire(state, deadline)
+                error = None
+                try:
+                    return await asyncio.wait_for(
+                        request(state.model), self.get_timeout(deadline)
+                    )
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    self.release(state, error=error)
+
+        return await self.route(model, attempt)
+
+    async def stream(
+        self, model: str, request: Callable[[str], AsyncIterator[str]]
+    ) -> Tuple[str, RoutedStream]:
+        # Retries and fallback only cover the wait for the first chunk, so no
+        # partial text is ever sent twice.
+        async def attempt(state: ProviderState, deadline: float) -> RoutedStream:
+            with tracer.span(
+                SPAN_NAMES.PROVIDER_FIRST_CHUNK.value,
+                kind=SPAN_KINDS.CLIENT.value,
+                model=state.model,
+            ):
+                await self.acquire(state, deadline)
+                chunks = request(state.model).__aiter__()
+                try:
+                    first = await asyncio.wait_for(
+                        chunks.__anext__(), self.get_timeout(deadline)
+                    )
+                except StopAsyncIteration:
+                    first = None
+                except BaseException as e:
+                    self.release(state, error=e)
+                    raise
+            stream = RoutedStream(self, state, chunks, first)
+            if first is None:
+                stream.close()
+            return stream
+
+        return await self.route(model, attempt)
+
+    async def route(self, model: str, attempt) -> tuple:
+        if model not in self.states:
+            raise ProviderUnavailable(model)
+
+        deadline = asyncio.get_running_loop().time() + PROVIDER_DEADLINE
+        error = None
+        for candidate in self.get_candidates(model):
+            state = self.states[candidate]
+            try:
+                result = await self.retry(state, attempt, deadline)
+            except ProviderRejected as e:
+                error = e
+                continue
+            except Exception as e:
+                logger.warning(f"{candidate} request failed: {e!r}")
+                error = e
+                continue
+            if candidate != model:
+                self.states[model].fallbacks += 1
+                provider_fallbacks_total.inc(model=model)
+                logger.info("Answered %s request with %s", model, candidate)
+            return candidate, result
+        raise ProviderUnavailable(model) from error
+
+    async def retry(self, state: ProviderState, attempt, deadline: float):
+        loop = asyncio.get_running_loop()
+        for retry in range(PROVIDER_MAX_RETRIES + 1):
+            try:
+                return await attempt(state, deadline)
+            except ProviderRejected:
+                raise
+            except Exception as e:
+                if retry == PROVIDER_MAX_RETRIES or not is_retryable_error(e):
+                    raise
+                # Full jitter keeps retries from many sockets from lining up.
+                delay = random.uniform(
+                    0,
+                    min(PROVIDER_RETRY_MAX_DELAY, PROVIDER_RETRY_BASE_DELAY * 2**retry),
+                )
+                if loop.time() + delay >= deadline:
+                    raise
+            state.retries += 1
+            provider_retries_total.inc(model=state.model)
+            await asyncio.sleep(delay)
+
+    def get_timeout(self, deadline: float) -> float:
+        return max(
+            0, min(PROVIDER_TIMEOUT, deadline - asyncio.get_running_loop().time())
+        )
+
+    def reject(self, state: ProviderState, reason: str):
+        state.rejections += 1
+        provider_rejections_total.inc(model=state.model, reason=reason)
+        raise ProviderRejected(state.model, reason)
+
+    async def acquire(self, state: ProviderState, deadline: float):
+        if state.waiting >= state.max_queue:
+            self.reject(state, "queue_full")
+        if not state.breaker.allow():
+            self.reject(state, "circuit_open")
+
+        state.waiting += 1
+        state.update_metrics()
+        try:
+            await asyncio.wait_for(
+                state.semaphore.acquire(), self.get_timeout(deadline)
+            )
+        except asyncio.TimeoutError:
+            state.breaker.release()
+            self.reject(state, "queue_timeout")
+        except BaseException:
+            state.breaker.release()
+            raise
+        finally:
+            state.waiting -= 1
+        state.in_flight += 1
+        state.calls += 1
+        state.update_metrics()
+
+    def release(self, state: ProviderState, error: Optional[BaseException] = None):
+        state.in_flight -= 1
+        state.semaphore.release()
+        if error is None:
+            state.breaker.record_success()
+        elif isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            state.breaker.release()
+        else:
+            state.failures += 1
+            provider_errors_total.inc(model=state.model)
+            if is_provider_failure(error):
+                state.breaker.record_failure()
+            else:
+                state.breaker.release()
+        state.update_metrics()
+
+    def snapshot(self) -> dict:
+        states = {model: state.snapshot() for model, state in self.states.items()}
+        return {
+            "healthy": any(
+                state["state"] != CIRCUIT_STATES.OPEN.value for state in states.values()
+            ),
+            "fallback": PROVIDER_FALLBACK,
+            "providers": states,
+        }
+
+
+providerRouter = ProviderRouter([model.value for model in AI_MODELS])
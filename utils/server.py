@@ -0,0 +1,105 @@
+import importlib.util
+from typing import Union
+import uvicorn
+from constants.base import HOST, PORT
+from constants.server import (
+    SERVER_APP,
+    SERVER_BACKLOG,
+    SERVER_HTTP,
+    SERVER_HTTP_PROTOCOLS,
+    SERVER_KEEP_ALIVE,
+    SERVER_LOOP,
+    SERVER_LOOPS,
+    SERVER_WORKERS,
+    WS_COMPRESSION,
+    WS_MAX_SIZE,
+    WS_PROTOCOL_PING_INTERVAL,
+    WS_PROTOCOL_PING_TIMEOUT,
+)
+from constants.redis import SINGLE_FLIGHT_ENABLED, SINGLE_FLIGHT_REDIS
+from constants.websocket import CLUSTER_ENABLED
+from utils.logger import logger
+
+
+def is_installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def select_implementation(requested: str, auto: str, fast: str, fallback: str) -> str:
+    # "auto" takes the fast implementation when it is installed; asking for it
+    # by name without it installed falls back instead of failing the start.
+    if requested not in (auto, fast):
+        return requested
+    if is_installed(fast):
+        return fast
+    if requested == fast:
+        logger.warning(f"{fast} is not installed, using {fallback}")
+    return fallback
+
+
+def select_loop(loop: str = SERVER_LOOP) -> str:
+    return select_implementation(
+        loop,
+        SERVER_LOOPS.AUTO.value,
+        SERVER_LOOPS.UVLOOP.value,
+        SERVER_LOOPS.ASYNCIO.value,
+    )
+
+
+def select_http(http: str = SERVER_HTTP) -> str:
+    return select_implementation(
+        http,
+        SERVER_HTTP_PROTOCOLS.AUTO.value,
+        SERVER_HTTP_PROTOCOLS.HTTPTOOLS.value,
+        SERVER_HTTP_PROTOCOLS.H11.value,
+    )
+
+
+def build_server_config(
+    app: Union[str, object], host: str, port: int, workers: int
+) -> dict:
+    return {
+        "app": app,
+        "host": host,
+        "port": port,
+        "workers": workers,
+        "loop": select_loop(),
+        "http": select_http(),
+        "backlog": SERVER_BACKLOG,
+        "timeout_keep_alive": SERVER_KEEP_ALIVE,
+        "ws_max_size": WS_MAX_SIZE,
+        "ws_ping_interval": WS_PROTOCOL_PING_INTERVAL or None,
+        "ws_ping_timeout": WS_PROTOCOL_PING_TIMEOUT or None,
+        "ws_per_message_deflate": WS_COMPRESSION,
+    }
+
+
+def run_server(
+    app: Union[str, object] = SERVER_APP,
+    host: str = HOST,
+    port: int = PORT,
+    workers: int = SERVER_WORKERS,
+):
+    # One worker serves the app in this process. More workers need the app as
+    # an import string: uvicorn binds the socket once, then a supervisor
+    # spawns the workers, which accept from the shared socket, and replaces
+    # any that die.
+    workers = max(workers, 1)
+    if workers > 1 and not isinstance(app, str):
+        app = SERVER_APP
+    config = build_server_config(app=app, host=host, port=port, workers=workers)
+    if workers > 1 and not CLUSTER_ENABLED:
+        logger.warning(
+            "Running several workers without CLUSTER_ENABLED: a device that"
+            " reconnects to another worker keeps its old session there"
+        )
+    if workers > 1 and SINGLE_FLIGHT_ENABLED and not SINGLE_FLIGHT_REDIS:
+        logger.warning(
+            "Single-flight only coalesces queries within each worker;"
+            " set SINGLE_FLIGHT_REDIS to share it"
+        )
+    logger.info(
+        f"Starting {workers} worker(s) on {host}:{port}"
+        f" with loop={config['loop']}, http={config['http']}"
+    )
+    uvicorn.run(**config)
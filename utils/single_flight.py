@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, Dict, List, Optional
+import uuid
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from constants.ai import GPT_CONTEXT_MESSAGE_KEYS
+from constants.redis import (
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_KEY,
+    SINGLE_FLIGHT_LOCK_TTL,
+    SINGLE_FLIGHT_POLL_INTERVAL,
+    SINGLE_FLIGHT_REDIS,
+    SINGLE_FLIGHT_RESULT_TTL,
+)
+from utils.cache import get_payload_content, normalize_text
+from utils.logger import logger
+from utils.metrics import single_flight_requests_total
+
+# Tries to take the lock for making the call. A caller that finds the lock
+# held is counted as a waiter, and only waiters may pick up the result the
+# holder leaves behind; the last one to read it deletes it. Taking the lock
+# drops whatever an earlier flight left over.
+ACQUIRE_FLIGHT_SCRIPT = """
+local waiting = ARGV[3] == "1"
+if waiting then
+    local result = redis.call("GET", KEYS[2])
+    if result then
+        if redis.call("DECR", KEYS[3]) <= 0 then
+            redis.call("DEL", KEYS[2], KEYS[3])
+        end
+        return {0, result}
+    end
+end
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    redis.call("DEL", KEYS[2], KEYS[3])
+    return {1}
+end
+if not waiting then
+    redis.call("INCR", KEYS[3])
+end
+redis.call("PEXPIRE", KEYS[3], ARGV[2])
+return {0}
+"""
+
+# Frees the lock, but only while this worker holds it, and leaves the result
+# for the waiters if there are any.
+RELEASE_FLIGHT_SCRIPT = """
+if redis.call("GET", KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[1])
+if ARGV[2] == "1" and tonumber(redis.call("GET", KEYS[3]) or "0") > 0 then
+    redis.call("SET", KEYS[2], ARGV[3], "PX", ARGV[4])
+end
+return 1
+"""
+
+
+def build_flight_key(model: str, context_messages: List[dict]) -> str:
+    payload = [
+        [
+            message.get(f"{GPT_CONTEXT_MESSAGE_KEYS.ROLE.value}"),
+            normalize_text(get_payload_content(message)),
+        ]
+        for message in context_messages
+    ]
+    return hashlib.sha256(
+        json.dumps([model, payload], ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def get_flight_keys(key: str) -> List[str]:
+    # The hash tag keeps the lock, result and waiter count in one cluster slot.
+    return [
+        f"{{{SINGLE_FLIGHT_KEY}:{key}}}:lock",
+        f"{{{SINGLE_FLIGHT_KEY}:{key}}}:result",
+        f"{{{SINGLE_FLIGHT_KEY}:{key}}}:waiters",
+    ]
+
+
+class Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Identical queries in flight at the same time share one provider call.
+    # Every caller waits on the shared task through a shield, so one caller
+    # being cancelled does not cancel the others; the call itself is only
+    # dropped once every caller has gone.
+    def __init__(
+        self, enabled: bool = SINGLE_FLIGHT_ENABLED, shared: bool = SINGLE_FLIGHT_REDIS
+    ):
+        self.enabled = enabled
+        self.shared = shared
+        self.flights: Dict[str, Flight] = {}
+        self.acquire_script = None
+        self.release_script = None
+
+    async def do(
+        self,
+        model: str,
+        context_messages: List[dict],
+        call: Callable[[], Awaitable[str]],
+        redis: Redis,
+    ) -> str:
+        if not self.enabled:
+            return await call()
+
+        key = build_flight_key(model, context_messages)
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight(asyncio.create_task(self.run(key, call, redis)))
+            flight.task.add_done_callback(lambda _: self.forget(key, flight))
+            self.flights[key] = flight
+        else:
+            single_flight_requests_total.inc(role="local")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                self.forget(key, flight)
+                flight.task.cancel()
+
+    def forget(self, key: str, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    async def run(self, key: str, call: Callable[[], Awaitable[str]], redis: Redis):
+        if not self.shared:
+            single_flight_requests_total.inc(role="leader")
+            return await call()
+
+        keys = get_flight_keys(key)
+        token = uuid.uuid4().hex
+        acquired, result = await self.acquire(keys, token, redis)
+        if result is not None:
+            single_flight_requests_total.inc(role="redis")
+            return result
+
+        single_flight_requests_total.inc(role="leader")
+        if not acquired:
+            return await call()
+        result = None
+        try:
+            result = await call()
+        finally:
+            await self.release(keys, token, result, redis)
+        return result
+
+    async def acquire(self, keys: List[str], token: str, redis: Redis) -> tuple:
+        # Polls until the result shows up or the lock is free. A holder that
+        # fails releases the lock without a result, so the next poller calls
+        # the provider itself instead of sharing the error.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SINGLE_FLIGHT_LOCK_TTL
+        if self.acquire_script is None:
+            self.acquire_script = redis.register_script(ACQUIRE_FLIGHT_SCRIPT)
+        waiting = False
+        try:
+            while True:
+                reply = await self.acquire_script(
+                    keys=keys,
+                    args=[
+                        token,
+                        int(SINGLE_FLIGHT_LOCK_TTL * 1000),
+                        "1" if waiting else "0",
+                    ],
+                    client=redis,
+                )
+                if len(reply) > 1:
+                    return False, reply[1]
+                if reply[0] or loop.time() >= deadline:
+                    return bool(reply[0]), None
+                waiting = True
+                await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        except RedisError as e:
+            logger.warning(f"Single-flight lock failed: {e}")
+            return False, None
+
+    async def release(
+        self, keys: List[str], token: str, result: Optional[str], redis: Redis
+    ):
+        if self.release_script is None:
+            self.release_script = redis.register_script(RELEASE_FLIGHT_SCRIPT)
+        try:
+            await self.release_script(
+                keys=keys,
+                args=[
+                    token,
+                    "0" if result is None else "1",
+                    result or "",
+                    int(SINGLE_FLIGHT_RESULT_TTL * 1000),
+                ],
+                client=redis,
+            )
+        except RedisError as e:
+            logger.warning(f"Single-flight release failed: {e}")
+
+
+singleFlight = SingleFlight()
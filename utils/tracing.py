@@ -0,0 +1,250 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+from logging.handlers import QueueListener, RotatingFileHandler
+import os
+import queue
+import sys
+import time
+from typing import Dict, List, Optional
+from constants.tracing import (
+    SERVICE_NAME,
+    SPAN_KINDS,
+    SPAN_STATUS_CODES,
+    TRACE_FILE_BACKUPS,
+    TRACE_FILE_MAX_BYTES,
+    TRACE_FILE_PATH,
+    TRACE_MAX_SPANS,
+    TRACE_QUEUE_SIZE,
+    TRACE_SLOW_THRESHOLD,
+    TRACING_ENABLED,
+)
+from utils.logger import logger
+from utils.metrics import traces_exported_total
+
+
+def build_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        # OTLP JSON carries 64-bit integers as strings.
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent_id: Optional[str],
+        kind: int,
+        attributes: Dict[str, object],
+    ):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                build_attribute(key, value)
+                for key, value in self.attributes.items()
+                if value is not None
+            ],
+            "status": (
+                {"code": SPAN_STATUS_CODES.ERROR.value, "message": self.error}
+                if self.error is not None
+                else {"code": SPAN_STATUS_CODES.UNSET.value}
+            ),
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.finished = False
+
+    def add(self, span: Span) -> bool:
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def finish(self, end_ns: int):
+        # Tasks started inside the trace may still hold spans open; they end
+        # with the trace so the export has no zero end times.
+        self.finished = True
+        for span in self.spans:
+            if not span.end_ns:
+                span.end_ns = end_ns
+                span.set_attribute("unfinished", True)
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class TraceFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, ensure_ascii=False)
+
+
+class TraceFileHandler(RotatingFileHandler):
+    def handleError(self, record: logging.LogRecord):
+        logger.warning(f"Trace export failed: {sys.exc_info()[1]}")
+
+
+class TraceExporter:
+    # Writes each slow trace as one OTLP/JSON ExportTraceServiceRequest per
+    # line, the layout of the OpenTelemetry file exporter, so the files can be
+    # replayed into a collector. The file rotates by size. Encoding and
+    # writing happen on a listener thread; the loop only builds the request
+    # and queues it, and drops it when the queue is full.
+    def __init__(self, path: str, max_bytes: int, backups: int, queue_size: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue: queue.Queue = queue.Queue(queue_size)
+        self.listener: Optional[QueueListener] = None
+
+    def start(self):
+        if self.listener is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = TraceFileHandler(
+            self.path,
+            maxBytes=self.max_bytes,
+            backupCount=self.backups,
+            encoding="utf-8",
+            delay=True,
+        )
+        handler.setFormatter(TraceFormatter())
+        self.listener = QueueListener(self.queue, handler)
+        self.listener.start()
+
+    def export(self, trace: Trace):
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            build_attribute("service.name", SERVICE_NAME),
+                            build_attribute("process.pid", os.getpid()),
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": SERVICE_NAME},
+                            "spans": [span.to_otlp() for span in trace.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        try:
+            self.start()
+            self.queue.put_nowait(logging.makeLogRecord({"msg": request}))
+            traces_exported_total.inc()
+        except queue.Full:
+            logger.warning("Trace export queue is full, dropping a trace")
+        except OSError as e:
+            logger.warning(f"Trace export failed: {e}")
+
+    def stop(self):
+        # Writes out whatever is still queued.
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+class Tracer:
+    # Spans follow the current task through a context variable. A trace starts
+    # at an entry point (a connect or a client action); spans opened outside
+    # one cost a context variable lookup and nothing else. Only traces slower
+    # than the threshold are exported.
+    def __init__(self, enabled: bool, threshold: float, exporter: TraceExporter):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.exporter = exporter
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace()
+        span = Span(trace, name, None, SPAN_KINDS.SERVER.value, attributes)
+        trace.add(span)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+            trace.finish(span.end_ns)
+            if trace.dropped:
+                span.set_attribute("dropped_spans", trace.dropped)
+            if (span.end_ns - span.start_ns) / 1e9 >= self.threshold:
+                self.exporter.export(trace)
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KINDS.INTERNAL.value, **attributes):
+        parent = current_span.get()
+        # Tasks started inside a trace inherit its span and may outlive it.
+        if parent is None or parent.trace.finished:
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, kind, attributes)
+        if not parent.trace.add(span):
+            yield None
+            return
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+
+
+tracer = Tracer(
+    enabled=TRACING_ENABLED,
+    threshold=TRACE_SLOW_THRESHOLD,
+    exporter=TraceExporter(
+        path=TRACE_FILE_PATH,
+        max_bytes=TRACE_FILE_MAX_BYTES,
+        backups=TRACE_FILE_BACKUPS,
+        queue_size=TRACE_QUEUE_SIZE,
+    ),
+)
@@ -1,24 +1,534 @@
-from fastapi import WebSocket
-from typing import Dict
+import asyncio
+from collections import deque
+import json
+import os
+import socket
+import time
+from typing import Deque, Dict, List, Optional, Set
+import uuid
+from fastapi import WebSocket, WebSocketDisconnect
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from constants.redis import CLUSTER_NODE_KEY, CLUSTER_NODES_KEY, CLUSTER_PRESENCE_KEY
+from constants.websocket import (
+    CLUSTER_ACTIONS,
+    CLUSTER_ENABLED,
+    CLUSTER_HEARTBEAT_INTERVAL,
+    CLUSTER_MESSAGE_KEYS,
+    CLUSTER_NODE_ID,
+    CLUSTER_NODE_TTL,
+    AI_WS_MESSAGE_TYPE,
+    AI_WS_SEND_KEYS,
+    LIVENESS_TYPES,
+    WS_CLOSE_CODES,
+    WS_CLOSE_TIMEOUT,
+    WS_IDLE_TIMEOUT,
+    WS_KEYS,
+    WS_MAX_CONNECTIONS,
+    WS_PING_INTERVAL,
+    WS_PONG_TIMEOUT,
+    WS_REAP_INTERVAL,
+    WS_SEND_QUEUE_POLICIES,
+    WS_SEND_QUEUE_POLICY,
+    WS_SEND_QUEUE_SIZE,
+)
+from utils.codec import json_dumps
 from utils.logger import logger
+from utils.metrics import (
+    metricsRegistry,
+    websocket_coalesced_frames_total,
+    websocket_dropped_frames_total,
+    websocket_reaped_total,
+    websocket_rejected_total,
+    websocket_slow_disconnects_total,
+)
+from utils.rate_limit import rateLimiter
+from utils.redis import redisManager
+
+# Presence entries are "<node id> <connection id>". An entry is only removed
+# while it still names the connection that is going away.
+RELEASE_PRESENCE_SCRIPT = """
+redis.call("SREM", KEYS[2], ARGV[1])
+if redis.call("HGET", KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call("HDEL", KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Restores the entries of a node that was reaped while it was still serving.
+# Devices another node claimed in the meantime are left to that node.
+RECLAIM_PRESENCE_SCRIPT = """
+local claimed = 0
+for index = 1, #ARGV, 2 do
+    local owner = redis.call("HGET", KEYS[1], ARGV[index])
+    if not owner then
+        redis.call("HSET", KEYS[1], ARGV[index], ARGV[index + 1])
+        claimed = claimed + 1
+    end
+    if not owner or owner == ARGV[index + 1] then
+        redis.call("SADD", KEYS[2], ARGV[index])
+    end
+end
+return claimed
+"""
+
+# Drops the presence entries still owned by a node that stopped heartbeating.
+REAP_NODE_SCRIPT = """
+local prefix = ARGV[1] .. " "
+for _, device in ipairs(redis.call("SMEMBERS", KEYS[3])) do
+    local owner = redis.call("HGET", KEYS[1], device)
+    if owner and string.sub(owner, 1, #prefix) == prefix then
+        redis.call("HDEL", KEYS[1], device)
+    end
+end
+redis.call("DEL", KEYS[3])
+return redis.call("ZREM", KEYS[2], ARGV[1])
+"""
+
+
+class Connection:
+    # Outbound frames go through a bounded queue drained by one writer task, so
+    # a slow client never stalls the handler that produced the frame.
+    def __init__(self, websocket: WebSocket, device_id: str, connection_id: str):
+        self.websocket = websocket
+        self.device_id = device_id
+        self.connection_id = connection_id
+        self.queue: Deque[dict] = deque()
+        self.ready = asyncio.Event()
+        self.close_code: Optional[int] = None
+        self.closed = asyncio.Event()
+        self.connected_at = self.last_seen = self.last_active = time.monotonic()
+        self.ping_sent: Optional[float] = None
+        self.writer = asyncio.create_task(self.write())
+
+    async def receive_json(self) -> dict:
+        data = await self.websocket.receive_json()
+        self.last_seen = time.monotonic()
+        self.ping_sent = None
+        if data.get(f"{WS_KEYS.ACTION.value}") not in LIVENESS_TYPES:
+            self.last_active = self.last_seen
+        return data
+
+    async def check_liveness(self, now: float) -> Optional[str]:
+        # Returns why the connection should be closed, pinging it first when
+        # it has gone quiet.
+        if WS_IDLE_TIMEOUT and now - self.last_active >= WS_IDLE_TIMEOUT:
+            return "idle"
+        if not WS_PING_INTERVAL:
+            return None
+        if self.ping_sent is not None:
+            return "unresponsive" if now - self.ping_sent >= WS_PONG_TIMEOUT else None
+        if now - self.last_seen >= WS_PING_INTERVAL:
+            self.ping_sent = now
+            await self.send_json(
+                {f"{AI_WS_SEND_KEYS.TYPE.value}": AI_WS_MESSAGE_TYPE.PING.value}
+            )
+        return None
+
+    async def send_json(self, message: dict):
+        if self.close_code is not None or self.coalesce(message):
+            return
+        if len(self.queue) >= WS_SEND_QUEUE_SIZE:
+            if (
+                WS_SEND_QUEUE_POLICY == WS_SEND_QUEUE_POLICIES.DROP.value
+                and self.drop_partial()
+            ):
+                websocket_dropped_frames_total.inc()
+            else:
+                logger.warning("Closing slow websocket client: %s", self.device_id)
+                websocket_slow_disconnects_total.inc()
+                self.queue.clear()
+                self.close_code = WS_CLOSE_CODES.TRY_AGAIN_LATER.value
+                self.ready.set()
+                return
+        self.queue.append(message)
+        self.ready.set()
+
+    def drop_partial(self) -> bool:
+        # Only stream chunks may be dropped: the full reply follows them, while
+        # any other frame would be lost for good.
+        partial = AI_WS_MESSAGE_TYPE.PARTIAL_MESSAGE.value
+        for index, queued in enumerate(self.queue):
+            if queued.get(f"{AI_WS_SEND_KEYS.TYPE.value}") == partial:
+                del self.queue[index]
+                return True
+        return False
+
+    def coalesce(self, message: dict) -> bool:
+        # Stream chunks for the same message merge into the newest queued one,
+        # which the writer has not picked up yet.
+        if not self.queue:
+            return False
+        last = self.queue[-1]
+        partial = AI_WS_MESSAGE_TYPE.PARTIAL_MESSAGE.value
+        if (
+            message.get(f"{AI_WS_SEND_KEYS.TYPE.value}") != partial
+            or last.get(f"{AI_WS_SEND_KEYS.TYPE.value}") != partial
+        ):
+            return False
+        data = message[f"{AI_WS_SEND_KEYS.DATA.value}"]
+        last_data = last[f"{AI_WS_SEND_KEYS.DATA.value}"]
+        if (
+            data[f"{AI_WS_SEND_KEYS.ID.value}"]
+            != last_data[f"{AI_WS_SEND_KEYS.ID.value}"]
+        ):
+            return False
+        self.queue[-1] = {
+            f"{AI_WS_SEND_KEYS.TYPE.value}": partial,
+            f"{AI_WS_SEND_KEYS.DATA.value}": {
+                **last_data,
+                f"{AI_WS_SEND_KEYS.PROMPT.value}": last_data[
+                    f"{AI_WS_SEND_KEYS.PROMPT.value}"
+                ]
+                + data[f"{AI_WS_SEND_KEYS.PROMPT.value}"],
+            },
+        }
+        websocket_coalesced_frames_total.inc()
+        return True
+
+    async def write(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue:
+                    message = self.queue.popleft()
+                    await self.websocket.send_text(json_dumps(message).decode())
+                if self.close_code is not None:
+                    await self.websocket.close(code=self.close_code)
+                    return
+        except (WebSocketDisconnect, RuntimeError, OSError) as e:
+            logger.info(f"Websocket writer stopped for {self.device_id}: {e!r}")
+        finally:
+            # Lets the endpoint stop reading a socket whose peer never answers
+            # the close.
+            self.closed.set()
+
+    async def close(self, code: int = WS_CLOSE_CODES.NORMAL.value):
+        if self.close_code is None:
+            self.close_code = code
+            self.ready.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self.writer), WS_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.writer.cancel()
+            try:
+                await self.websocket.close(code=code)
+            except RuntimeError:
+                pass
+
+    def stop(self):
+        self.queue.clear()
+        self.writer.cancel()
+        self.closed.set()
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "queued_frames": len(self.queue),
+            "connected_seconds": now - self.connected_at,
+            "idle_seconds": now - self.last_active,
+        }
+
+
+def get_node_devices_key(node_id: str) -> str:
+    return f"{CLUSTER_NODE_KEY}:{node_id}:devices"
+
+
+def get_node_channel(node_id: str) -> str:
+    return f"{CLUSTER_NODE_KEY}:{node_id}"
 
 
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(self, node_id: str = CLUSTER_NODE_ID, cluster: bool = CLUSTER_ENABLED):
+        self.active_connections: Dict[str, Connection] = {}
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.cluster = cluster
+        self.redis: Optional[Redis] = None
+        self.tasks: List[asyncio.Task] = []
+        self.closing: Set[asyncio.Task] = set()
 
-    async def connect(self, websocket: WebSocket, device_id: str):
+    async def connect(
+        self, websocket: WebSocket, device_id: str
+    ) -> Optional[Connection]:
         await websocket.accept()
-        self.active_connections[device_id] = websocket
+        previous = self.active_connections.get(device_id)
+        if (
+            WS_MAX_CONNECTIONS
+            and previous is None
+            and len(self.active_connections) >= WS_MAX_CONNECTIONS
+        ):
+            # Accepting first lets the client see why it was turned away.
+            logger.warning("Websocket connection rejected, worker full: %s", device_id)
+            websocket_rejected_total.inc()
+            await websocket.close(code=WS_CLOSE_CODES.TRY_AGAIN_LATER.value)
+            return None
+        connection = Connection(websocket, device_id, uuid.uuid4().hex)
+        self.active_connections[device_id] = connection
         logger.info("Websocket connection established: %s", device_id)
 
-    def disconnect(self, device_id: str):
-        self.active_connections.pop(device_id, None)
+        if previous is not None:
+            await previous.close(code=WS_CLOSE_CODES.SESSION_REPLACED.value)
+        if self.cluster:
+            await self.claim(device_id, connection.connection_id)
+        return connection
 
-    async def send_json(self, device_id: str, message: dict):
+    async def disconnect(self, connection: Connection):
+        connection.stop()
+        # A replaced connection must not unregister the one that replaced it.
+        if self.active_connections.get(connection.device_id) is not connection:
+            return
+        del self.active_connections[connection.device_id]
+        if self.cluster:
+            await self.release(connection.device_id, connection.connection_id)
+
+    async def send_json(self, device_id: str, message: dict) -> bool:
         connection = self.active_connections.get(device_id)
         if connection:
             await connection.send_json(message)
+            return True
+        if not self.cluster:
+            return False
+
+        owner = await self.get_owner(device_id)
+        if owner is None:
+            return False
+        receivers = await self.publish(
+            owner,
+            {
+                f"{CLUSTER_MESSAGE_KEYS.ACTION.value}": CLUSTER_ACTIONS.SEND.value,
+                f"{CLUSTER_MESSAGE_KEYS.DEVICE_ID.value}": device_id,
+                f"{CLUSTER_MESSAGE_KEYS.MESSAGE.value}": message,
+            },
+        )
+        return receivers > 0
+
+    async def get_owner(self, device_id: str) -> Optional[str]:
+        presence = await self.get_redis().hget(CLUSTER_PRESENCE_KEY, device_id)
+        return presence.split(" ", 1)[0] if presence else None
+
+    async def publish(self, node_id: str, message: dict) -> int:
+        return await self.get_redis().publish(
+            get_node_channel(node_id), json.dumps(message)
+        )
+
+    def get_redis(self) -> Redis:
+        return self.redis or redisManager.get_redis()
+
+    async def claim(self, device_id: str, connection_id: str):
+        redis = self.get_redis()
+        try:
+            pipeline = redis.pipeline(transaction=True)
+            pipeline.hget(CLUSTER_PRESENCE_KEY, device_id)
+            pipeline.hset(
+                CLUSTER_PRESENCE_KEY, device_id, f"{self.node_id} {connection_id}"
+            )
+            pipeline.sadd(get_node_devices_key(self.node_id), device_id)
+            previous, _, _ = await pipeline.execute()
+            if not previous:
+                return
+            node_id, previous_connection_id = previous.split(" ", 1)
+            if node_id != self.node_id:
+                await self.publish(
+                    node_id,
+                    {
+                        f"{CLUSTER_MESSAGE_KEYS.ACTION.value}": CLUSTER_ACTIONS.CLOSE.value,
+                        f"{CLUSTER_MESSAGE_KEYS.DEVICE_ID.value}": device_id,
+                        f"{CLUSTER_MESSAGE_KEYS.CONNECTION_ID.value}": previous_connection_id,
+                    },
+                )
+        except RedisError as e:
+            logger.warning(f"Presence claim failed for {device_id}: {e}")
+
+    async def release(self, device_id: str, connection_id: str):
+        redis = self.get_redis()
+        try:
+            await redis.register_script(RELEASE_PRESENCE_SCRIPT)(
+                keys=[CLUSTER_PRESENCE_KEY, get_node_devices_key(self.node_id)],
+                args=[device_id, f"{self.node_id} {connection_id}"],
+                client=redis,
+            )
+        except RedisError as e:
+            logger.warning(f"Presence release failed for {device_id}: {e}")
+
+    async def reap(self, node_id: str, redis: Redis):
+        await redis.register_script(REAP_NODE_SCRIPT)(
+            keys=[
+                CLUSTER_PRESENCE_KEY,
+                CLUSTER_NODES_KEY,
+                get_node_devices_key(node_id),
+            ],
+            args=[node_id],
+            client=redis,
+        )
+        logger.info("Reaped cluster node: %s", node_id)
+
+    async def reclaim(self, redis: Redis):
+        args = []
+        for device_id, connection in list(self.active_connections.items()):
+            args.extend([device_id, f"{self.node_id} {connection.connection_id}"])
+        if not args:
+            return
+        claimed = await redis.register_script(RECLAIM_PRESENCE_SCRIPT)(
+            keys=[CLUSTER_PRESENCE_KEY, get_node_devices_key(self.node_id)],
+            args=args,
+            client=redis,
+        )
+        logger.warning(
+            "Cluster node was reaped while serving, reclaimed %s devices", claimed
+        )
+
+    async def heartbeat(self, redis: Redis):
+        while True:
+            try:
+                now = int(time.time() * 1000)
+                expired_before = now - int(CLUSTER_NODE_TTL * 1000)
+                pipeline = redis.pipeline(transaction=False)
+                pipeline.zscore(CLUSTER_NODES_KEY, self.node_id)
+                pipeline.zadd(CLUSTER_NODES_KEY, {self.node_id: now})
+                pipeline.zrangebyscore(CLUSTER_NODES_KEY, "-inf", expired_before)
+                last_seen, _, dead_nodes = await pipeline.execute()
+                # Missing or expired: a peer may have reaped this node during a
+                # pause and dropped the presence of devices still served here.
+                if last_seen is None or last_seen <= expired_before:
+                    await self.reclaim(redis)
+                for node_id in dead_nodes:
+                    await self.reap(node_id, redis)
+            except RedisError as e:
+                logger.warning(f"Cluster heartbeat failed: {e}")
+            await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+
+    async def listen(self, redis: Redis):
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(get_node_channel(self.node_id))
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        # A malformed message is dropped on its own rather
+                        # than tearing down the subscription.
+                        try:
+                            await self.handle_cluster_message(
+                                json.loads(message["data"])
+                            )
+                        except (ValueError, KeyError, TypeError) as e:
+                            logger.warning(f"Dropping cluster message: {e!r}")
+            except RedisError as e:
+                logger.warning(f"Cluster listener failed: {e}")
+                await asyncio.sleep(CLUSTER_HEARTBEAT_INTERVAL)
+
+    async def handle_cluster_message(self, data: dict):
+        device_id = data[f"{CLUSTER_MESSAGE_KEYS.DEVICE_ID.value}"]
+        connection = self.active_connections.get(device_id)
+        if connection is None:
+            return
+        match data[f"{CLUSTER_MESSAGE_KEYS.ACTION.value}"]:
+            case CLUSTER_ACTIONS.SEND.value:
+                await connection.send_json(
+                    data[f"{CLUSTER_MESSAGE_KEYS.MESSAGE.value}"]
+                )
+            case CLUSTER_ACTIONS.CLOSE.value:
+                if connection.connection_id == data.get(
+                    f"{CLUSTER_MESSAGE_KEYS.CONNECTION_ID.value}"
+                ):
+                    logger.info("Websocket session taken over: %s", device_id)
+                    # Closing waits for the queue to drain, which must not
+                    # hold up the messages for other devices.
+                    task = asyncio.create_task(
+                        connection.close(code=WS_CLOSE_CODES.SESSION_REPLACED.value)
+                    )
+                    self.closing.add(task)
+                    task.add_done_callback(self.closing.discard)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(WS_REAP_INTERVAL)
+            now = time.monotonic()
+            expired = []
+            for connection in list(self.active_connections.values()):
+                if connection.close_code is not None:
+                    continue
+                reason = await connection.check_liveness(now)
+                if reason is not None:
+                    logger.info(
+                        "Closing %s websocket: %s", reason, connection.device_id
+                    )
+                    websocket_reaped_total.inc(reason=reason)
+                    expired.append(connection)
+            await asyncio.gather(
+                *[
+                    connection.close(code=WS_CLOSE_CODES.GOING_AWAY.value)
+                    for connection in expired
+                ]
+            )
+            rateLimiter.local.prune(now=int(time.time() * 1000))
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        connections = [
+            connection.snapshot(now) for connection in self.active_connections.values()
+        ]
+        return {
+            "connections": len(connections),
+            "max_connections": WS_MAX_CONNECTIONS,
+            "queued_frames": sum(item["queued_frames"] for item in connections),
+            "max_queued_frames": max(
+                (item["queued_frames"] for item in connections), default=0
+            ),
+            "max_idle_seconds": max(
+                (item["idle_seconds"] for item in connections), default=0
+            ),
+            "max_connected_seconds": max(
+                (item["connected_seconds"] for item in connections), default=0
+            ),
+        }
+
+    async def start(self, redis: Redis):
+        self.tasks = [asyncio.create_task(self.sweep())]
+        if not self.cluster:
+            return
+        self.redis = redis
+        self.tasks.extend(
+            [
+                asyncio.create_task(self.heartbeat(redis)),
+                asyncio.create_task(self.listen(redis)),
+            ]
+        )
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.cluster and self.redis is not None:
+            try:
+                await self.reap(self.node_id, self.redis)
+            except RedisError as e:
+                logger.warning(f"Cluster node cleanup failed: {e}")
 
 
 webSocketManager = WebSocketManager()
+
+metricsRegistry.gauge(
+    "ai_websocket_active_connections",
+    "WebSocket connections open on this worker.",
+    callback=lambda: len(webSocketManager.active_connections),
+)
+metricsRegistry.gauge(
+    "ai_websocket_send_queue_depth",
+    "Outbound frames queued across connections on this worker.",
+    callback=lambda: sum(
+        len(connection.queue)
+        for connection in webSocketManager.active_connections.values()
+    ),
+)
+metricsRegistry.gauge(
+    "ai_websocket_send_queue_max_depth",
+    "Deepest outbound queue of a single connection on this worker.",
+    callback=lambda: max(
+        (
+            len(connection.queue)
+            for connection in webSocketManager.active_connections.values()
+        ),
+        default=0,
+    ),
+)